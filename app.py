@@ -1,8 +1,6 @@
 # app.py
 import os, subprocess, tarfile, urllib.request, stat, streamlit as st
 
-st.set_page_config(page_title="Toolstack", page_icon="favicon.ico", layout="wide")
-
 NODE_VER = "v20.14.0"
 NODE_DIST = f"node-{NODE_VER}-linux-x64"
 CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "toolstack")
@@ -46,44 +44,53 @@ def ensure_node_deps():
             status.update(label="Node dependencies installed", state="complete")
 
 
-ensure_node_deps()
+def main():
+    st.set_page_config(page_title="Toolstack", page_icon="favicon.ico", layout="wide")
+
+    ensure_node_deps()
+
+    from components.session import sessions
+    from components.sidebar import sidebar
+    from components.image_format_converter_section import image_format_converter_section
+    from components.bg_remover_section import bg_remover_section
+    from components.png2svg_section import png2svg_section
+    from components.pick_color_section import pick_color_section
+    from components.data_format_converter_section import data_format_converter_section
+    from components.extract_pdf_tables_section import extract_pdf_tables_section
+
+    sessions()
+    sidebar()
 
-from components.session import sessions
-from components.sidebar import sidebar
-from components.image_format_converter_section import image_format_converter_section
-from components.bg_remover_section import bg_remover_section
-from components.png2svg_section import png2svg_section
-from components.pick_color_section import pick_color_section
-from components.data_format_converter_section import data_format_converter_section
-from components.extract_pdf_tables_section import extract_pdf_tables_section
+    tool = st.session_state.tool
+    if tool == "intro":
+        st.title("Toolstack")
+        st.markdown(
+            "### Welcome!\n"
+            "Pick a tool from the **sidebar** on the left to get started.\n"
+        )
+        st.info("Use the left panel to explore available tools.")
 
-sessions()
-sidebar()
 
-tool = st.session_state.tool
-if tool == "intro":
-    st.title("Toolstack")
-    st.markdown(
-        "### Welcome!\n"
-        "Pick a tool from the **sidebar** on the left to get started.\n"
-    )
-    st.info("Use the left panel to explore available tools.")
+    elif tool == "Image Format Converter":
+        image_format_converter_section()
 
+    elif tool == "Background Remover":
+        bg_remover_section()
 
-elif tool == "Image Format Converter":
-    image_format_converter_section()
+    elif tool == "PNG to SVG":
+        png2svg_section()
 
-elif tool == "Background Remover":
-    bg_remover_section()
+    elif tool == "Click to Pick Color":
+        pick_color_section()
 
-elif tool == "PNG to SVG":
-    png2svg_section()
+    elif tool == "Data Format Converter":
+        data_format_converter_section()
 
-elif tool == "Click to Pick Color":
-    pick_color_section()
+    elif tool == "Extract PDF Tables":
+        extract_pdf_tables_section()
 
-elif tool == "Data Format Converter":
-    data_format_converter_section()
 
-elif tool == "Extract PDF Tables":
-    extract_pdf_tables_section()
+# Streamlit runs this script as __main__; process-pool workers (spawn) import
+# it as __mp_main__ and must not build the UI.
+if __name__ == "__main__":
+    main()
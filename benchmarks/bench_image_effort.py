@@ -0,0 +1,78 @@
+"""Encode time and output size per encoder effort preset.
+
+Encodes a fixed, generated corpus (a noisy photo-like gradient, a flat
+graphic with hard edges, and a translucent RGBA image) to every lossy and
+lossless output format at each preset in
+tools.image_format_converter_tool.EFFORTS. Only encoding is timed; images
+are decoded and prepared once up front.
+
+    python benchmarks/bench_image_effort.py [--size 1600] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.image_format_converter_tool import EFFORTS, _encode, _prepare  # noqa: E402
+
+FORMATS = ("PNG", "JPEG", "WEBP", "HEIF")
+
+
+def corpus(size: int, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    w, h = size, size * 2 // 3
+    yy, xx = np.mgrid[0:h, 0:w].astype(np.float32)
+
+    base = np.stack([xx / w * 255, yy / h * 255, (xx + yy) / (w + h) * 255], -1)
+    photo = np.clip(base + rng.normal(0, 12, base.shape), 0, 255).astype(np.uint8)
+
+    graphic = Image.new("RGB", (w, h), "white")
+    draw = ImageDraw.Draw(graphic)
+    for i in range(40):
+        x0, y0 = rng.integers(0, w), rng.integers(0, h)
+        box = (x0, y0, x0 + rng.integers(20, w // 4), y0 + rng.integers(20, h // 4))
+        draw.rectangle(box, fill=tuple(int(c) for c in rng.integers(0, 256, 3)))
+        draw.text((x0 + 4, y0 + 4), f"label {i}", fill="black")
+
+    alpha = (np.hypot(xx - w / 2, yy - h / 2) < h * 0.45) * 255
+    rgba = np.dstack([photo, alpha.astype(np.uint8)])
+
+    return {
+        "photo": Image.fromarray(photo),
+        "graphic": graphic,
+        "rgba": Image.fromarray(rgba),
+    }
+
+
+def bench(img, fmt: str, effort: str, repeat: int):
+    prepared = _prepare(img, fmt, (255, 255, 255))
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        data = _encode(prepared, fmt, effort=effort)
+        times.append(time.perf_counter() - t0)
+    return sorted(times)[len(times) // 2], len(data)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--size", type=int, default=1600, help="image width in px")
+    ap.add_argument("--repeat", type=int, default=3, help="runs per cell (median)")
+    args = ap.parse_args()
+
+    images = corpus(args.size)
+    print(f"{'image':<8} {'format':<6} {'effort':<9} {'ms':>8} {'KB':>9}")
+    for name, img in images.items():
+        for fmt in FORMATS:
+            for effort in EFFORTS:
+                secs, size = bench(img, fmt, effort, args.repeat)
+                print(f"{name:<8} {fmt:<6} {effort:<9} {secs * 1000:8.1f} {size / 1024:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
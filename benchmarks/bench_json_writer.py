@@ -0,0 +1,99 @@
+"""Time and peak memory of the JSON writers in the data converter.
+
+Compares the old double-serialization path (DataFrame.to_json ->
+json.loads -> json.dumps(indent=4)) with the record-streaming encoder in
+tools.data_fomat_converter_tool, pretty and compact, plus JSONL. The
+pretty output must be byte-identical to the old path.
+
+    python benchmarks/bench_json_writer.py [--rows 200000] [--chunk 100000]
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.data_fomat_converter_tool import convert_stream  # noqa: E402
+
+
+def make_csv(rows: int, seed: int = 0) -> bytes:
+    """Mixed numeric / text / date table with some missing values."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(
+        {
+            "id": np.arange(rows),
+            "price": rng.lognormal(3, 1, rows).round(4),
+            "ratio": rng.random(rows),
+            "city": rng.choice(["Zürich", "São Paulo", "Oslo", "a/b"], rows),
+            "when": pd.date_range("2020-01-01", periods=rows, freq="min"),
+        }
+    )
+    df.loc[::11, "ratio"] = np.nan
+    return df.to_csv(index=False).encode()
+
+
+def _upload(data: bytes) -> io.BytesIO:
+    f = io.BytesIO(data)
+    f.name = "bench.csv"
+    return f
+
+
+def old_path(data: bytes) -> bytes:
+    df = pd.read_csv(io.BytesIO(data))
+    records = json.loads(df.to_json(orient="records"))
+    return json.dumps(records, indent=4, ensure_ascii=False).encode("utf-8")
+
+
+def new_path(data: bytes, fmt: str, pretty: bool, chunk: int) -> bytes:
+    out = io.BytesIO()
+    convert_stream(fmt, _upload(data), out, chunk, pretty)
+    return out.getvalue()
+
+
+def measure(fn):
+    """Wall time of a plain run, then peak allocations of a traced one."""
+    t0 = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - t0
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 2**20
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rows", type=int, default=200_000)
+    ap.add_argument("--chunk", type=int, default=100_000, help="rows per chunk")
+    args = ap.parse_args()
+
+    data = make_csv(args.rows)
+    runs = [
+        ("old to_json/loads/dumps", lambda: old_path(data)),
+        ("stream pretty", lambda: new_path(data, "JSON", True, args.chunk)),
+        ("stream compact", lambda: new_path(data, "JSON", False, args.chunk)),
+        ("stream JSONL", lambda: new_path(data, "JSONL", True, args.chunk)),
+    ]
+
+    print(f"{args.rows} rows, {len(data) / 2**20:.1f} MB CSV")
+    print(f"{'writer':<26} {'time s':>8} {'peak MB':>9} {'out MB':>8}")
+    outputs = {}
+    for name, fn in runs:
+        out, secs, peak = measure(fn)
+        outputs[name] = out
+        print(f"{name:<26} {secs:8.2f} {peak:9.1f} {len(out) / 2**20:8.1f}")
+
+    same = outputs["stream pretty"] == outputs["old to_json/loads/dumps"]
+    print(f"pretty output identical to old path: {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Latency and edge quality of the remove_bg edge-refinement engines.
+
+Builds a synthetic photo with a known soft-edged alpha, simulates the model's
+coarse mask (ground truth at 320px, upsampled back like rembg does) and runs
+each quality level of tools.remove_bg_tool on it, so the numbers isolate the
+refinement step from inference.
+
+    python benchmarks/bench_matting.py [--size 1280] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.remove_bg_tool import QUALITY_LEVELS, _cutout  # noqa: E402
+
+
+def synthetic_scene(size: int, seed: int = 0):
+    """Textured foreground blob with a soft, wispy edge over a busy background."""
+    rng = np.random.default_rng(seed)
+    w, h = size, int(size * 2 / 3)
+    yy, xx = np.mgrid[0:h, 0:w].astype(np.float64)
+
+    # soft ellipse with a noisy fringe, like hair or fur
+    r = np.hypot((xx - w / 2) / (w * 0.3), (yy - h / 2) / (h * 0.35))
+    theta = np.arctan2(yy - h / 2, xx - w / 2)
+    fringe = 0.05 * np.sin(theta * 40) + 0.03 * np.sin(theta * 97)
+    alpha = np.clip((1.0 + fringe - r) / 0.06 + 0.5, 0.0, 1.0)
+
+    fg = np.dstack([0.8 - 0.3 * yy / h, 0.3 + 0.2 * np.sin(xx / 17), 0.25 + 0 * xx])
+    bg = np.dstack([0.3 * xx / w, 0.6 + 0.2 * np.sin(yy / 9), 0.7 - 0.4 * xx / w])
+    bg += rng.normal(0, 0.03, bg.shape)
+    img = alpha[..., None] * fg + (1 - alpha[..., None]) * bg
+    img = Image.fromarray((np.clip(img, 0, 1) * 255).astype(np.uint8))
+    return img, alpha
+
+
+def coarse_mask(alpha: np.ndarray) -> Image.Image:
+    """What a 320px segmentation model hands back after rembg's resize."""
+    gt = Image.fromarray((alpha * 255).astype(np.uint8))
+    small = gt.resize((320, 320), Image.LANCZOS).filter(ImageFilter.GaussianBlur(1))
+    return small.resize(gt.size, Image.LANCZOS)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--size", type=int, default=1280, help="image width in px")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    img, gt = synthetic_scene(args.size)
+    mask = coarse_mask(gt)
+    band = (gt > 0.01) & (gt < 0.99)
+
+    print(f"image {img.width}x{img.height}, edge band {band.sum()} px\n")
+    print(f"{'quality':<8} {'best ms':>9} {'SAD/1k':>8} {'band MSE':>10}")
+    for quality in QUALITY_LEVELS:
+        times = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            out = _cutout(img, mask, quality)
+            times.append(time.perf_counter() - t0)
+        alpha = np.asarray(out.convert("RGBA").getchannel("A"), dtype=np.float64) / 255
+        sad = np.abs(alpha - gt).sum() / 1000
+        mse = ((alpha - gt)[band] ** 2).mean()
+        print(f"{quality:<8} {min(times) * 1000:9.1f} {sad:8.2f} {mse:10.5f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Peak RSS of PDF table extraction versus page count.
+
+Generates ruled-table PDFs of increasing length (hand-written PDF, no extra
+dependencies) and extracts them in a fresh subprocess per run, comparing the
+old keep-every-page loop with tools.extract_pdf_tables_tool. The tool's peak
+should stay roughly flat as pages grow; the baseline's grows linearly.
+
+    python benchmarks/bench_pdf_memory.py [--pages 50,200,800] [--rows 10]
+"""
+import argparse
+import io
+import os
+import resource
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_pdf(n_pages: int, rows: int = 10, cols: int = 4) -> bytes:
+    """A PDF with one ruled rows x cols table (plus header row) per page."""
+    objs = [b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>", None]
+    font_id, pages_id = 1, 2
+    kids = []
+    x0, y0, cw, rh = 50, 750, 120, 20
+    for p in range(n_pages):
+        ops = []
+        for r in range(rows + 2):
+            y = y0 - r * rh
+            ops.append(f"{x0} {y} m {x0 + cw * cols} {y} l S")
+        for c in range(cols + 1):
+            x = x0 + c * cw
+            ops.append(f"{x} {y0} m {x} {y0 - (rows + 1) * rh} l S")
+        for r in range(rows + 1):
+            for c in range(cols):
+                text = f"H{c}" if r == 0 else f"p{p + 1}r{r}c{c}"
+                tx, ty = x0 + c * cw + 4, y0 - (r + 1) * rh + 6
+                ops.append(f"BT /F1 9 Tf {tx} {ty} Td ({text}) Tj ET")
+        stream = "\n".join(ops).encode()
+        objs.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objs.append(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] "
+            b"/Contents %d 0 R /Resources << /Font << /F1 %d 0 R >> >> >>"
+            % (pages_id, len(objs), font_id)
+        )
+        kids.append(len(objs))
+    refs = b" ".join(b"%d 0 R" % k for k in kids)
+    objs[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (refs, len(kids))
+    objs.append(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objs, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (i, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objs) + 1)
+    out += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objs) + 1,
+        len(objs),
+        xref,
+    )
+    return bytes(out)
+
+
+def _baseline(data: bytes) -> None:
+    """The pre-flush loop: every page keeps its layout cache until close."""
+    import pdfplumber
+
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        for page in pdf.pages:
+            page.extract_tables()
+
+
+def _child(mode: str, pages: int, rows: int) -> None:
+    data = make_pdf(pages, rows)
+    if mode == "baseline":
+        _baseline(data)
+    else:
+        os.environ["TOOLSTACK_CACHE_MB"] = "0"
+        from tools.extract_pdf_tables_tool import extract_pdf_tables
+
+        extract_pdf_tables(data, workers=1)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(peak if sys.platform == "darwin" else peak * 1024)
+
+
+def _peak_mb(mode: str, pages: int, rows: int) -> float:
+    out = subprocess.run(
+        [sys.executable, __file__, "--child", mode, str(pages), str(rows)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return int(out.split()[-1]) / 2**20
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--pages", default="50,200,800", help="comma-separated counts")
+    ap.add_argument("--rows", type=int, default=10, help="table rows per page")
+    ap.add_argument("--child", nargs=3, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        mode, pages, rows = args.child
+        _child(mode, int(pages), int(rows))
+        return
+
+    print(f"{'pages':>6} {'baseline MB':>12} {'tool MB':>9}")
+    for pages in (int(p) for p in args.pages.split(",")):
+        base = _peak_mb("baseline", pages, args.rows)
+        tool = _peak_mb("tool", pages, args.rows)
+        print(f"{pages:>6} {base:12.1f} {tool:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
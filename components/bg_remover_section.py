@@ -1,17 +1,20 @@
 import time
 import streamlit as st
-from io import BytesIO
-from tools.remove_bg_tool import remove_bg, get_session
+from tools.remove_bg_tool import remove_bg_batch_previews, get_session, DEFAULT_MODEL
 
-try:
-    from tools.helpers import run_in_thread
-except Exception:
-    import concurrent.futures
+from tools.helpers import PREVIEW_WIDTH, run_batch, pool_for
+from components.result_store import clear_results, download_result, get_result, put_result
 
-    _EXEC = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+# images per model run in remove_bg_batch
+BATCH_SIZE = 4
 
-    def run_in_thread(fn, *args, **kwargs):
-        return _EXEC.submit(fn, *args, **kwargs)
+# label -> remove_bg quality
+EDGE_QUALITY = {
+    "High (closed-form matting)": "high",
+    "Refined (guided filter, fast)": "refine",
+    "Trimap band matting": "trimap",
+    "Fast (raw mask)": "fast",
+}
 
 
 def bg_remover_section():
@@ -19,7 +22,9 @@ def bg_remover_section():
 
     @st.cache_resource
     def warm_session():
-        return get_session("isnet-general-use")
+        # preload the model remove_bg_batch will actually use; return nothing
+        # so Streamlit's cache doesn't pin it past the session manager's LRU
+        get_session(DEFAULT_MODEL)
 
     warm_session()
 
@@ -38,6 +43,16 @@ def bg_remover_section():
         if resize_enabled
         else 0
     )
+    edge_label = st.selectbox(
+        "Edge quality",
+        list(EDGE_QUALITY),
+        help="Guided filter is much faster than matting and usually as clean on hair/fur.",
+    )
+    full_res = st.toggle(
+        "Full-resolution output",
+        value=False,
+        help="Run the model on a downscaled copy and apply its mask to the original pixels.",
+    )
 
     has_files = bool(files)
     has_results = bool(st.session_state["bg_results"])
@@ -58,7 +73,7 @@ def bg_remover_section():
         )
 
     def clear_bg():
-        st.session_state["bg_results"] = []
+        clear_results("bg_results")
         st.session_state["bg_key"] = (
             f"bg-uploader-{time.time()}"  # reset uploader so files clear
         )
@@ -68,38 +83,47 @@ def bg_remover_section():
         if files:
             total = len(files)
             status_placeholder = st.empty()
-            for idx, f in enumerate(files, start=1):
-                raw = f.read()
-                status_placeholder.markdown(
-                    f"**Removing background {idx} / {total}:** {f.name}"
-                )
-
-                progress = st.progress(0, text="Starting…")
-                future = run_in_thread(remove_bg, raw, max_width)
-                pct = 10
-                while not future.done():
-                    pct = min(pct + 2, 90)
-                    progress.progress(pct, text="Running rembg…")
-                    time.sleep(0.05)
-
-                png_bytes, preview_img = future.result()
-                progress.progress(100, text="Done")
-                time.sleep(0.1)
-                progress.empty()
-
-                thumb = preview_img.copy()
-                thumb.thumbnail((900, 900))
-                buf = BytesIO()
-                thumb.save(buf, format="PNG")
-                thumb_bytes = buf.getvalue()
+            status_placeholder.markdown(f"**Removing background from {total} image(s)…**")
+            progress = st.progress(0, text="Starting…")
+
+            def report(done, total):
+                progress.progress(done / total, text=f"Batch {done} / {total}")
+
+            # one job per inference batch; each runs the model on a stacked tensor
+            chunks = [files[i : i + BATCH_SIZE] for i in range(0, total, BATCH_SIZE)]
+            jobs = [([f.getvalue() for f in chunk], max_width) for chunk in chunks]
+            results = run_batch(
+                remove_bg_batch_previews,
+                jobs,
+                kwargs={"full_res": full_res, "quality": EDGE_QUALITY[edge_label]},
+                kind=pool_for("bg"),
+                on_progress=report,
+            )
+
+            time.sleep(0.1)
+            progress.empty()
+
+            per_file = []
+            for chunk, (res, err) in zip(chunks, results):
+                if err is not None:
+                    per_file += [(None, err)] * len(chunk)
+                else:
+                    per_file += [(r, None) for r in res]
+
+            for f, (res, err) in zip(files, per_file):
+                if err is not None:
+                    st.error(f"**{f.name}** failed: {err}")
+                    continue
+                png_bytes, preview, (width, height) = res
 
                 st.session_state.bg_results.append(
                     {
                         "name": f.name.rsplit(".", 1)[0] + "_rmbg.png",
-                        "bytes": png_bytes,
-                        "preview": thumb_bytes,
-                        "width": preview_img.width,
-                        "height": preview_img.height,
+                        # no preview: the PNG is small and shown as itself
+                        "blob": put_result(png_bytes, pin=preview is None),
+                        "preview": put_result(preview, pin=True),
+                        "width": width,
+                        "height": height,
                     }
                 )
             status_placeholder.empty()
@@ -107,7 +131,7 @@ def bg_remover_section():
     if has_files and not st.session_state.bg_results:
         run_bg()
     if has_files and rerun_clicked:
-        st.session_state["bg_results"] = []
+        clear_results("bg_results")
         run_bg()
     if clear_clicked:
         clear_bg()
@@ -118,12 +142,12 @@ def bg_remover_section():
                 st.subheader(f"{i}. {r['name']}")
                 st.caption(f"Preview ({r['width']} × {r['height']} px)")
             with col2:
-                st.download_button(
+                download_result(
                     "⬇ Download",
-                    data=r["bytes"],
+                    r["blob"],
                     file_name=r["name"],
                     mime="image/png",
                     key=f"dl-cut-{i}-{r['name']}",
                     use_container_width=True,
                 )
-            st.image(r["preview"], width=300)
+            st.image(get_result(r["preview"] or r["blob"]), width=PREVIEW_WIDTH)
@@ -1,37 +1,64 @@
 # data_format_converter_section.py
 import time
 import streamlit as st
-from tools.data_fomat_converter_tool import data_format_converter
-from tools.helpers import bytesio_with_name
-
-try:
-    from tools.helpers import run_in_thread
-except Exception:
-    import concurrent.futures
-
-    _EXEC = concurrent.futures.ThreadPoolExecutor(max_workers=1)
-
-    def run_in_thread(fn, *args, **kwargs):
-        return _EXEC.submit(fn, *args, **kwargs)
-
+from tools.data_fomat_converter_tool import (
+    ENGINES,
+    data_format_converter,
+    data_format_converter_sheets,
+)
+from tools.helpers import run_batch, pool_for
+from components.result_store import clear_results, download_result, put_result
 
 
 def data_format_converter_section():
     st.title("Data Format Converter")
 
     # --- Output format selection
-    label_to_fmt = {"txt": "TXT", "csv": "CSV", "json": "JSON", "xlsx": "XLSX"}
+    label_to_fmt = {
+        "txt": "TXT",
+        "csv": "CSV",
+        "json": "JSON",
+        "jsonl": "JSONL",
+        "xlsx": "XLSX",
+        "parquet": "PARQUET",
+        "feather": "FEATHER",
+    }
     choice = st.selectbox("Convert to", list(label_to_fmt.keys()), index=0)
     to_format = label_to_fmt[choice]
+    pretty = True
+    if to_format == "JSON":
+        pretty = st.toggle(
+            "Pretty-print JSON",
+            value=True,
+            help="Indented output; turn off for a compact single-line array.",
+        )
+    engine = st.selectbox(
+        "Parser engine",
+        list(ENGINES),
+        index=0,
+        help="pyarrow parses CSV/TXT on all cores; faster for large files, same output.",
+    )
 
     # --- Upload
     files = st.file_uploader(
         "Upload files",
-        type=["txt", "csv", "json", "xlsx"],
+        type=["txt", "csv", "json", "jsonl", "xlsx"],
         accept_multiple_files=True,
         key=st.session_state.file_key,
     )
 
+    sheet, all_sheets = "", False
+    if any(f.name.lower().endswith(".xlsx") for f in files or []):
+        s1, s2 = st.columns([3, 1])
+        with s1:
+            sheet = st.text_input(
+                "Sheet",
+                placeholder="first sheet",
+                help="XLSX only: a sheet name or number (1 = first).",
+            ).strip()
+        with s2:
+            all_sheets = st.toggle("All sheets", help="One output per sheet.")
+
     has_files = bool(files)
     has_results = bool(st.session_state["file_results"])
 
@@ -52,7 +79,7 @@ def data_format_converter_section():
         )
 
     def clear_files():
-        st.session_state["file_results"] = []
+        clear_results("file_results")
         st.session_state["file_key"] = f"file-uploader-{time.time()}"
         st.rerun()
 
@@ -60,47 +87,52 @@ def data_format_converter_section():
         "TXT": "text/plain",
         "CSV": "text/csv",
         "JSON": "application/json",
+        "JSONL": "application/x-ndjson",
         "XLSX": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        "PARQUET": "application/vnd.apache.parquet",
+        "FEATHER": "application/vnd.apache.arrow.file",
     }
 
     def run_files():
         if files:
             total = len(files)
             status = st.empty()
-
-            for idx, f in enumerate(files, start=1):
-                raw = f.read()
-
-                status.markdown(f"**Converting {idx}/{total}:** {f.name}")
-                progress = st.progress(0, text="Starting…")
-
-                file_like = bytesio_with_name(raw, f.name)
-
-                future = run_in_thread(data_format_converter, to_format, file_like)
-                pct = 10
-                while not future.done():
-                    pct = min(pct + 3, 95)
-                    progress.progress(pct, text=f"Converting to {choice}…")
-                    time.sleep(0.05)
-
-                try:
-                    out_name, out_bytes = future.result()
-                except Exception as e:
-                    progress.empty()
-                    st.error(f"**{f.name}** failed: {e}")
+            status.markdown(f"**Converting {total} file(s) to {choice}…**")
+            progress = st.progress(0, text="Starting…")
+
+            def report(done, total):
+                progress.progress(done / total, text=f"Converted {done}/{total}")
+
+            jobs = [(to_format, f) for f in files]
+            kwargs = {"pretty": pretty, "engine": engine}
+            if all_sheets:
+                convert = data_format_converter_sheets
+            else:
+                convert = data_format_converter
+                kwargs["sheet"] = sheet or None
+            results = run_batch(
+                convert,
+                jobs,
+                kwargs=kwargs,
+                kind=pool_for("data"),
+                on_progress=report,
+            )
+
+            time.sleep(0.05)
+            progress.empty()
+
+            for f, (res, err) in zip(files, results):
+                if err is not None:
+                    st.error(f"**{f.name}** failed: {err}")
                     continue
-
-                progress.progress(100, text="Done")
-                time.sleep(0.05)
-                progress.empty()
-
-                st.session_state.file_results.append(
-                    {
-                        "name": out_name,
-                        "bytes": out_bytes,
-                        "mime": mime_map.get(to_format, "application/octet-stream"),
-                    }
-                )
+                for out_name, out_bytes in res if all_sheets else [res]:
+                    st.session_state.file_results.append(
+                        {
+                            "name": out_name,
+                            "blob": put_result(out_bytes),
+                            "mime": mime_map.get(to_format, "application/octet-stream"),
+                        }
+                    )
 
             status.empty()
 
@@ -108,7 +140,7 @@ def data_format_converter_section():
         run_files()
 
     if rerun_clicked:
-        st.session_state.file_results = []
+        clear_results("file_results")
         run_files()
 
     if clear_clicked:
@@ -121,9 +153,9 @@ def data_format_converter_section():
             with c1:
                 st.write(f"{i}. **{r['name']}**")
             with c2:
-                st.download_button(
+                download_result(
                     "⬇ Download",
-                    data=r["bytes"],
+                    r["blob"],
                     file_name=r["name"],
                     mime=r["mime"],
                     key=f"dl-{i}-{r['name']}",
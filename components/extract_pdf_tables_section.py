@@ -3,18 +3,16 @@ import io
 import pandas as pd
 import streamlit as st
 from tools.extract_pdf_tables_tool import extract_pdf_tables
-from tools.helpers import bytesio_with_name
+from tools.helpers import run_batch, pool_for
+from components.result_store import clear_results, download_result, get_result, put_result
 
 
-try:
-    from tools.helpers import run_in_thread
-except Exception:
-    import concurrent.futures
-
-    _EXEC = concurrent.futures.ThreadPoolExecutor(max_workers=1)
-
-    def run_in_thread(fn, *args, **kwargs):
-        return _EXEC.submit(fn, *args, **kwargs)
+def _csv_head(data: bytes, rows: int = 3):
+    """Header plus the first `rows` rows of a CSV, kept as the result's preview."""
+    try:
+        return pd.read_csv(io.BytesIO(data), nrows=rows).to_csv(index=False).encode()
+    except Exception:
+        return None  # rendered as "Could not preview table"
 
 
 def extract_pdf_tables_section():
@@ -28,6 +26,20 @@ def extract_pdf_tables_section():
         key=st.session_state.pdf_table_key,
     )
 
+    pages = st.text_input(
+        "Pages", value="", placeholder="e.g. 1-3,5 (blank = all pages)"
+    )
+    region_enabled = st.toggle("Limit to a region", value=False)
+    bbox = None
+    if region_enabled:
+        st.caption("PDF points from the top-left corner (72 pt = 1 inch).")
+        r1, r2, r3, r4 = st.columns(4)
+        x0 = r1.number_input("Left", min_value=0.0, value=0.0)
+        top = r2.number_input("Top", min_value=0.0, value=0.0)
+        x1 = r3.number_input("Right", min_value=0.0, value=612.0)
+        bottom = r4.number_input("Bottom", min_value=0.0, value=792.0)
+        bbox = (x0, top, x1, bottom)
+
     has_files = bool(files)
     has_results = bool(st.session_state["pdf_table_results"])
 
@@ -48,7 +60,7 @@ def extract_pdf_tables_section():
         )
 
     def clear_files():
-        st.session_state["pdf_table_results"] = []
+        clear_results("pdf_table_results")
         st.session_state["pdf_table_key"] = f"pdf-table-uploader-{time.time()}"
         st.rerun()
 
@@ -57,40 +69,41 @@ def extract_pdf_tables_section():
             return
         total = len(files)
         status = st.empty()
+        status.markdown(f"**Extracting tables from {total} file(s)…**")
+        progress = st.progress(0, text="Starting…")
+
+        def report(done, total):
+            progress.progress(done / total, text=f"Extracted {done}/{total}")
+
+        jobs = [(f,) for f in files]
+        results = run_batch(
+            extract_pdf_tables,
+            jobs,
+            kwargs={"pages": pages or None, "bbox": bbox},
+            kind=pool_for("pdf"),
+            on_progress=report,
+        )
 
-        for idx, f in enumerate(files, start=1):
-            raw = f.read()
-            status.markdown(f"**Extracting {idx}/{total}:** {f.name}")
-            progress = st.progress(0, text="Starting…")
-
-            file_like = bytesio_with_name(raw, f.name)
-            future = run_in_thread(extract_pdf_tables, file_like)
-
-            pct = 10
-            while not future.done():
-                pct = min(pct + 2, 90)
-                progress.progress(pct, text=f"Extracting tables…")
-                time.sleep(0.05)
+        time.sleep(0.05)
+        progress.empty()
 
-            try:
-                result = future.result()
-            except Exception as e:
-                progress.empty()
-                st.error(f"**{f.name}** failed: {e}")
+        for f, (result, err) in zip(files, results):
+            if err is not None:
+                st.error(f"**{f.name}** failed: {err}")
                 continue
-            progress.progress(100, text="Done")
-            time.sleep(0.05)
-            progress.empty()
 
             if isinstance(result, list):
-                for out_name, out_bytes in result:
-                    st.session_state.pdf_table_results.append(
-                        {"name": out_name, "bytes": out_bytes, "mime": "text/csv"}
-                    )
+                outputs = result
             else:
-                out_name, out_bytes = result  # for single-output
+                outputs = [result]  # for single-output
+            for out_name, out_bytes in outputs:
                 st.session_state.pdf_table_results.append(
-                    {"name": out_name, "bytes": out_bytes, "mime": "text/csv"}
+                    {
+                        "name": out_name,
+                        "blob": put_result(out_bytes),
+                        "preview": put_result(_csv_head(out_bytes), pin=True),
+                        "mime": "text/csv",
+                    }
                 )
 
         status.empty()
@@ -99,7 +112,7 @@ def extract_pdf_tables_section():
         run_pdfs()
 
     if rerun_clicked:
-        st.session_state.pdf_table_results = []
+        clear_results("pdf_table_results")
         run_pdfs()
 
     if clear_clicked:
@@ -113,9 +126,9 @@ def extract_pdf_tables_section():
                 st.write(f"{i}. {r['name']}")
                 st.caption(f"Preview")
             with c2:
-                st.download_button(
+                download_result(
                     "⬇ Download",
-                    data=r["bytes"],
+                    r["blob"],
                     file_name=r["name"],
                     mime=r["mime"],
                     key=f"dl-{i}-{r['name']}",
@@ -123,7 +136,7 @@ def extract_pdf_tables_section():
                 )
             # Preview first 3 rows
             try:
-                preview_df = pd.read_csv(io.BytesIO(r["bytes"]))
-                st.dataframe(preview_df.head(3))
+                preview_df = pd.read_csv(io.BytesIO(get_result(r["preview"])))
+                st.dataframe(preview_df)
             except Exception as e:
                 st.error(f"Could not preview table: {e}")
@@ -1,20 +1,16 @@
 # image_format_converter_section.py
 import time
 import streamlit as st
-from io import BytesIO
 from tools.image_format_converter_tool import (
-    image_format_converter,
+    EFFORTS,
+    convert_with_preview,
 )
 
-try:
-    from tools.helpers import run_in_thread
-except Exception:
-    import concurrent.futures
+from tools.helpers import PREVIEW_WIDTH, run_batch, pool_for
+from components.result_store import clear_results, download_result, get_result, put_result
 
-    _EXEC = concurrent.futures.ThreadPoolExecutor(max_workers=1)
-
-    def run_in_thread(fn, *args, **kwargs):
-        return _EXEC.submit(fn, *args, **kwargs)
+# a target_bytes result under this share of the target gets a warning too
+_UNDER_TARGET = 0.5
 
 
 def image_format_converter_section():
@@ -30,6 +26,20 @@ def image_format_converter_section():
     }
     choice = st.selectbox("Convert to format", list(label_to_fmt.keys()), index=0)
     to_format = label_to_fmt[choice]
+    effort = st.selectbox(
+        "Encoder effort",
+        list(EFFORTS),
+        index=EFFORTS.index("smallest"),
+        help="fast encodes quickly; smallest spends more time for smaller files.",
+    )
+    target_kb = 0
+    if to_format in ("jpeg", "webp", "heif"):
+        target_kb = st.number_input(
+            "Target size (KB)",
+            min_value=0,
+            value=0,
+            help="Pick the quality automatically to fit this size. 0 = off",
+        )
 
     # --- File upload (broaden types beyond HEIC)
     files = st.file_uploader(
@@ -85,7 +95,7 @@ def image_format_converter_section():
 
     # clear
     def clear_images():
-        st.session_state["image_results"] = []
+        clear_results("image_results")
         st.session_state["image_key"] = f"image-uploader-{time.time()}"
         st.rerun()
 
@@ -94,39 +104,39 @@ def image_format_converter_section():
         if files:
             total = len(files)
             status_placeholder = st.empty()
-
-            for idx, f in enumerate(files, start=1):
-                raw = f.read()
-                status_placeholder.markdown(f"**Converting {idx} / {total}:** {f.name}")
-
-                progress = st.progress(0, text="Starting…")
-                future = run_in_thread(
-                    image_format_converter, to_format, raw, max_width
-                )
-
-                pct = 10
-                while not future.done():
-                    pct = min(pct + 2, 95)
-                    progress.progress(pct, text=f"Converting to {choice}…")
-                    time.sleep(0.05)
-
-                try:
-                    final_fmt, out_bytes, final_img = future.result()
-                except Exception as e:
-                    progress.empty()
-                    st.error(f"Skipping **{f.name}**: {e}")
+            status_placeholder.markdown(f"**Converting {total} image(s) to {choice}…**")
+            progress = st.progress(0, text="Starting…")
+
+            def report(done, total):
+                progress.progress(done / total, text=f"Converted {done} / {total}")
+
+            jobs = [(to_format, f.getvalue(), max_width) for f in files]
+            results = run_batch(
+                convert_with_preview,
+                jobs,
+                kwargs={"effort": effort, "target_bytes": int(target_kb) * 1024},
+                kind=pool_for("image"),
+                on_progress=report,
+            )
+
+            time.sleep(0.1)
+            progress.empty()
+
+            for f, (res, err) in zip(files, results):
+                if err is not None:
+                    st.error(f"Skipping **{f.name}**: {err}")
                     continue
-
-                progress.progress(100, text="Done")
-                time.sleep(0.1)
-                progress.empty()
-
-                # Build preview
-                thumb = final_img.copy()
-                thumb.thumbnail((900, 900))
-                buf = BytesIO()
-                thumb.save(buf, format="PNG")
-                thumb_bytes = buf.getvalue()
+                final_fmt, out_bytes, preview, (width, height) = res
+                if target_kb and len(out_bytes) > target_kb * 1024:
+                    st.warning(
+                        f"**{f.name}**: {len(out_bytes) // 1024} KB even at the lowest quality "
+                        f"(target {target_kb} KB); try a smaller max width."
+                    )
+                elif target_kb and len(out_bytes) < target_kb * 1024 * _UNDER_TARGET:
+                    st.warning(
+                        f"**{f.name}**: only {len(out_bytes) // 1024} KB (target {target_kb} KB); "
+                        "it is already small at full quality, or try another effort."
+                    )
 
                 # File naming + mime
                 base = f.name.rsplit(".", 1)[0]
@@ -137,10 +147,11 @@ def image_format_converter_section():
                 st.session_state.image_results.append(
                     {
                         "name": file_name,
-                        "bytes": out_bytes,
-                        "preview": thumb_bytes,
-                        "width": final_img.width,
-                        "height": final_img.height,
+                        # no preview: the output is small and shown as itself
+                        "blob": put_result(out_bytes, pin=preview is None),
+                        "preview": put_result(preview, pin=True),
+                        "width": width,
+                        "height": height,
                         "mime": mime,
                     }
                 )
@@ -149,7 +160,7 @@ def image_format_converter_section():
     if files and not st.session_state.image_results:
         run_images()
     if files and rerun_clicked:
-        st.session_state["image_results"] = []
+        clear_results("image_results")
         run_images()
     if clear_clicked:
         clear_images()
@@ -164,12 +175,12 @@ def image_format_converter_section():
                     st.caption(f"Preview ({r['width']} × {r['height']} px)")
 
             with col2:
-                st.download_button(
+                download_result(
                     "⬇ Download",
-                    data=r["bytes"],
+                    r["blob"],
                     file_name=r["name"],
                     mime=r["mime"],
                     key=f"dl-image-{i}-{r['name']}",
                     use_container_width=True,
                 )
-            st.image(r["preview"], width=300)
+            st.image(get_result(r["preview"] or r["blob"]), width=PREVIEW_WIDTH)
@@ -2,20 +2,20 @@
 import time
 import streamlit as st
 
-try:
-    from tools.helpers import (
-        run_in_thread,
-        embed_svg,
-        trace_with_imagetracer_node,
-        have_node,
-    )
-except Exception:
-    import concurrent.futures
-
-    _EXEC = concurrent.futures.ThreadPoolExecutor(max_workers=1)
-
-    def run_in_thread(fn, *args, **kwargs):
-        return _EXEC.submit(fn, *args, **kwargs)
+from tools.helpers import (
+    run_batch,
+    pool_for,
+    embed_svg,
+    trace_with_imagetracer_node,
+    have_node,
+)
+from components.result_store import (
+    PIN_MAX_BYTES,
+    clear_results,
+    download_result,
+    get_result,
+    put_result,
+)
 
 
 def png2svg_section():
@@ -119,69 +119,70 @@ def png2svg_section():
         )
 
     def clear_svg():
-        st.session_state["svg_results"] = []
+        clear_results("svg_results")
         st.session_state["svg_key"] = f"sbg-uploader-{time.time()}"
         st.rerun()
 
     def run_svg():
         if files:
+            if not have_node():
+                st.error("Node.js not available; cannot run ImageTracer engine.")
+                return
+
             total = len(files)
             status_placeholder = st.empty()
-
-            for idx, f in enumerate(files, start=1):
-                raw = f.read()
-                status_placeholder.markdown(
-                    f"**Vectorizing {idx} / {total}:** {f.name}"
-                )
-
-                progress = st.progress(0, text="Starting…")
-                if have_node():
-                    future = run_in_thread(
-                        trace_with_imagetracer_node,
-                        raw,
-                        mode=mode,
-                        layers=layers,
-                        upscale=upscale,
-                        preblur=preblur,
-                        median=median,
-                        mergecolors=mergecolors,
-                        dropwhite=dropwhite,
-                        svgo=svgo,
-                        palette_hex_csv=(custom_palette.strip() or None),
-                    )
-                else:
-                    st.error("Node.js not available; cannot run ImageTracer engine.")
-                    break
-
-                pct = 10
-                while not future.done():
-                    pct = min(pct + 2, 96)
-                    progress.progress(pct, text="Tracing shapes…")
-                    time.sleep(0.05)
-
-                # Collect result safely
-                try:
-                    svg_bytes = future.result()
-                except Exception:
-                    progress.empty()
+            status_placeholder.markdown(f"**Vectorizing {total} image(s)…**")
+            progress = st.progress(0, text="Starting…")
+
+            def report(done, total):
+                progress.progress(done / total, text=f"Traced {done} / {total}")
+
+            jobs = [(f.getvalue(),) for f in files]
+            results = run_batch(
+                trace_with_imagetracer_node,
+                jobs,
+                kwargs=dict(
+                    mode=mode,
+                    layers=layers,
+                    upscale=upscale,
+                    preblur=preblur,
+                    median=median,
+                    mergecolors=mergecolors,
+                    dropwhite=dropwhite,
+                    svgo=svgo,
+                    palette_hex_csv=(custom_palette.strip() or None),
+                ),
+                kind=pool_for("svg"),
+                on_progress=report,
+            )
+
+            time.sleep(0.1)
+            progress.empty()
+
+            for f, (svg_bytes, err) in zip(files, results):
+                if err is not None:
                     st.warning(
                         f"⚠️ Something went wrong for **{f.name}** — clear and try again."
                     )
                     continue
-
-                progress.progress(100, text="Done")
-                time.sleep(0.1)
-                progress.empty()
                 out_name = f.name.rsplit(".", 1)[0] + ".svg"
+                # small SVGs are their own (pinned) preview; big ones are read
+                # back only while their preview is switched on
+                embed = len(svg_bytes) <= PIN_MAX_BYTES
                 st.session_state.svg_results.append(
-                    {"name": out_name, "svg": svg_bytes}
+                    {
+                        "name": out_name,
+                        "blob": put_result(svg_bytes, pin=embed),
+                        "embed": embed,
+                        "size": len(svg_bytes),
+                    }
                 )
             status_placeholder.empty()
 
     if files and not st.session_state.svg_results:
         run_svg()
     if files and rerun_clicked:
-        st.session_state["svg_results"] = []
+        clear_results("svg_results")
         run_svg()
     if clear_clicked:
         clear_svg()
@@ -192,12 +193,15 @@ def png2svg_section():
             with col1:
                 st.subheader(f"{i}. {r['name']}")
             with col2:
-                st.download_button(
+                download_result(
                     "⬇ Download SVG",
-                    data=r["svg"],
+                    r["blob"],
                     file_name=r["name"],
                     mime="image/svg+xml",
                     key=f"dl-svg-{i}-{r['name']}",
                     use_container_width=True,
                 )
-            embed_svg(r["svg"])
+            if r["embed"] or st.toggle(
+                f"Show preview ({r['size'] // 1024} KB SVG)", key=f"show-svg-{i}-{r['name']}"
+            ):
+                embed_svg(get_result(r["blob"]))
@@ -0,0 +1,268 @@
+# result_store.py
+"""Bounded store for the output bytes sections keep between reruns.
+
+Result lists in st.session_state hold handles from put_result() rather than
+the bytes themselves. Blobs stay in memory up to a per-session and a global
+budget; past either, the largest resident blobs spill to files under a
+per-process temp directory. Entries unused for the TTL expire, which also
+reclaims results of sessions that have gone away. Small entries put with
+pin=True (previews shown on every rerun) never spill.
+
+    TOOLSTACK_SESSION_RESULTS_MB  per-session memory budget (default 64)
+    TOOLSTACK_RESULTS_MB          memory budget across sessions (default 512)
+    TOOLSTACK_RESULTS_TTL         seconds an unused entry lives (default 3600)
+    TOOLSTACK_RESULTS_DIR         parent directory for spill files
+"""
+import os
+import time
+import uuid
+import atexit
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Iterable, Optional
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# result dict keys that hold handles
+HANDLE_KEYS = ("blob", "preview")
+
+# largest entry put(pin=True) keeps in memory; bigger ones may spill anyway
+PIN_MAX_BYTES = 256 * 1024
+
+
+class _Entry:
+    __slots__ = ("session", "size", "blob", "path", "touched", "pinned")
+
+    def __init__(self, session: str, blob: bytes, now: float, pinned: bool = False):
+        self.session = session
+        self.size = len(blob)
+        self.blob = blob  # None once spilled
+        self.path = None
+        self.touched = now
+        self.pinned = pinned
+
+
+class ResultStore:
+    """Handle -> bytes, memory first, spilling to disk over budget."""
+
+    def __init__(self, session_bytes: int, total_bytes: int, ttl: float, spill_root: str = ""):
+        self.session_budget = session_bytes
+        self.total_budget = total_bytes
+        self.ttl = ttl
+        self.spill_root = spill_root or None
+        self._dir = None
+        # least recently used first, so expiry only looks at the front
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._resident = 0
+        self._session_resident = defaultdict(int)
+        self._lock = threading.Lock()
+
+    # ---- public
+    def put(self, session: str, blob: Optional[bytes], pin: bool = False) -> Optional[str]:
+        if blob is None:
+            return None
+        handle = uuid.uuid4().hex
+        now = time.monotonic()
+        pinned = pin and len(blob) <= PIN_MAX_BYTES
+        with self._lock:
+            self._expire(now)
+            self._entries[handle] = _Entry(session, bytes(blob), now, pinned)
+            self._resident += len(blob)
+            self._session_resident[session] += len(blob)
+            self._fit(session)
+        return handle
+
+    def get(self, handle: Optional[str]) -> Optional[bytes]:
+        """The blob, or None if the handle expired or was released."""
+        if handle is None:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(handle)
+            if entry is None:
+                return None
+            entry.touched = now
+            self._entries.move_to_end(handle)
+            if entry.blob is not None:
+                return entry.blob
+            path = entry.path
+        # spilled blobs are served from disk and left there
+        try:
+            with open(path, "rb") as fh:
+                return fh.read()
+        except OSError:
+            return None
+
+    def alive(self, handle: Optional[str]) -> bool:
+        """Whether `handle` is still stored; counts as a use for the TTL."""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(handle)
+            if entry is None:
+                return False
+            entry.touched = now
+            self._entries.move_to_end(handle)
+            return True
+
+    def resident(self, handle: Optional[str]) -> bool:
+        with self._lock:
+            entry = self._entries.get(handle)
+            return entry is not None and entry.blob is not None
+
+    def release(self, handles: Iterable[Optional[str]]) -> None:
+        with self._lock:
+            for handle in handles:
+                entry = self._entries.pop(handle, None)
+                if entry is not None:
+                    self._drop(entry)
+
+    def usage(self, session: Optional[str] = None) -> int:
+        """Resident bytes, for one session or overall."""
+        with self._lock:
+            if session is None:
+                return self._resident
+            return self._session_resident.get(session, 0)
+
+    # ---- internals (lock held)
+    def _expire(self, now: float) -> None:
+        while self._entries:
+            handle, entry = next(iter(self._entries.items()))
+            if now - entry.touched < self.ttl:
+                break
+            del self._entries[handle]
+            self._drop(entry)
+
+    def _drop(self, entry: _Entry) -> None:
+        if entry.blob is not None:
+            self._uncount(entry)
+        elif entry.path:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def _uncount(self, entry: _Entry) -> None:
+        self._resident -= entry.size
+        left = self._session_resident[entry.session] - entry.size
+        if left > 0:
+            self._session_resident[entry.session] = left
+        else:
+            self._session_resident.pop(entry.session, None)
+
+    def _fit(self, session: str) -> None:
+        # largest first: one big output frees more than many small previews
+        while self._session_resident.get(session, 0) > self.session_budget:
+            if not self._spill_largest(session):
+                return
+        while self._resident > self.total_budget:
+            heaviest = max(self._session_resident, key=self._session_resident.get)
+            if not self._spill_largest(heaviest):
+                return
+
+    def _spill_largest(self, session: str) -> bool:
+        candidates = [
+            (h, e)
+            for h, e in self._entries.items()
+            if e.session == session and e.blob is not None and not e.pinned
+        ]
+        if not candidates:
+            return False
+        handle, entry = max(candidates, key=lambda he: he[1].size)
+        try:
+            path = os.path.join(self._spill_dir(), handle)
+            with open(path, "wb") as fh:
+                fh.write(entry.blob)
+        except OSError:
+            return False  # no disk: stay over budget rather than lose results
+        self._uncount(entry)
+        entry.blob = None
+        entry.path = path
+        return True
+
+    def _spill_dir(self) -> str:
+        if self._dir is None:
+            root = self.spill_root or tempfile.gettempdir()
+            os.makedirs(root, exist_ok=True)
+            self._dir = tempfile.mkdtemp(prefix="toolstack-results-", dir=root)
+            atexit.register(shutil.rmtree, self._dir, True)
+        return self._dir
+
+
+_MB = 1024 * 1024
+_store = ResultStore(
+    session_bytes=int(os.environ.get("TOOLSTACK_SESSION_RESULTS_MB", 64)) * _MB,
+    total_bytes=int(os.environ.get("TOOLSTACK_RESULTS_MB", 512)) * _MB,
+    ttl=float(os.environ.get("TOOLSTACK_RESULTS_TTL", 3600)),
+    spill_root=os.environ.get("TOOLSTACK_RESULTS_DIR", ""),
+)
+
+
+def get_store() -> ResultStore:
+    return _store
+
+
+# ---------------- streamlit helpers ----------------
+def _session_id() -> str:
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else ""
+
+
+def put_result(blob: Optional[bytes], pin: bool = False) -> Optional[str]:
+    """Store `blob` for the current session; keep the handle in session_state.
+
+    pin=True for what a section renders on every rerun (previews, small
+    outputs shown as themselves), so a rerun never reads it back from disk.
+    """
+    return _store.put(_session_id(), blob, pin)
+
+
+def get_result(handle: Optional[str]) -> Optional[bytes]:
+    return _store.get(handle)
+
+
+def clear_results(name: str) -> None:
+    """Release the handles in st.session_state[name] and empty the list."""
+    results = st.session_state.get(name) or []
+    _store.release(r.get(k) for r in results for k in HANDLE_KEYS)
+    st.session_state[name] = []
+
+
+def prune_results(name: str) -> None:
+    """Drop entries of st.session_state[name] whose output has expired."""
+    results = st.session_state.get(name) or []
+    live, dead = [], []
+    for r in results:
+        # checking every handle also keeps a displayed result from expiring
+        ok = [_store.alive(r[k]) for k in HANDLE_KEYS if r.get(k) is not None]
+        (live if ok and all(ok) else dead).append(r)
+    if dead:
+        _store.release(r.get(k) for r in dead for k in HANDLE_KEYS)
+        st.session_state[name] = live
+
+
+def download_result(label: str, handle: Optional[str], *, file_name: str, mime: str, key: str, **kwargs):
+    """A download button that reads the blob only when it has to.
+
+    Resident blobs go straight to st.download_button. Spilled ones first show
+    a "Prepare" button, so a rerun doesn't pull every spilled result back
+    into memory; the click reads it and swaps in the real download button.
+    """
+    if not _store.alive(handle):
+        st.caption("Expired, run again to download.")
+        return
+    slot = st.empty()
+    if not _store.resident(handle):
+        if not slot.button(label.replace("Download", "Prepare"), key=f"prep-{key}", **kwargs):
+            return
+    data = _store.get(handle)
+    if data is None:
+        slot.caption("Expired, run again to download.")
+        return
+    slot.download_button(
+        label, data=data, file_name=file_name, mime=mime, key=key, on_click="ignore", **kwargs
+    )
@@ -1,5 +1,14 @@
 # session.py
 import streamlit as st
+from components.result_store import prune_results
+
+RESULT_LISTS = (
+    "file_results",
+    "image_results",
+    "bg_results",
+    "svg_results",
+    "pdf_table_results",
+)
 
 
 def sessions():
@@ -36,3 +45,7 @@ def sessions():
         st.session_state.pdf_table_results = []
     if "pdf_table_key" not in st.session_state:
         st.session_state.pdf_table_key = "pdf-table-uploader-0"
+
+    # handles whose bytes expired in the result store
+    for name in RESULT_LISTS:
+        prune_results(name)
@@ -0,0 +1,6 @@
+import os
+
+# the tests count calls and compare fresh results: keep the result cache's
+# memory tier off (set before any tools module is imported, and inherited
+# by pool workers)
+os.environ.setdefault("TOOLSTACK_CACHE_MB", "0")
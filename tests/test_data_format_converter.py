@@ -0,0 +1,263 @@
+import io
+
+import pytest
+
+from tools.data_fomat_converter_tool import convert_stream
+
+
+def _convert(raw: bytes, name: str, to_format: str, chunksize: int) -> bytes:
+    src = io.BytesIO(raw)
+    src.name = name
+    out = io.BytesIO()
+    convert_stream(to_format, src, out, chunksize=chunksize, pretty=False)
+    return out.getvalue()
+
+
+# a NaN (or text) that first shows up after a chunk boundary must not leave
+# earlier chunks with a different dtype than a single whole-file read
+CSV_CASES = [
+    b"a,b\n1,x\n2,y\n,z\n4,w\n",  # int column turns float
+    b"a\n1\n2\nx\n3\n",  # int column turns text
+    b"a\nTrue\nFalse\n\nTrue\n",  # bools with a NaN
+    b"a\n\n\n1\n2\n",  # NaN-only first chunk
+]
+
+
+@pytest.mark.parametrize("raw", CSV_CASES)
+@pytest.mark.parametrize("to_format", ["CSV", "JSON"])
+def test_csv_chunks_match_whole_file(raw, to_format):
+    whole = _convert(raw, "t.csv", to_format, chunksize=10**6)
+    for chunksize in (1, 2, 3):
+        assert _convert(raw, "t.csv", to_format, chunksize) == whole
+
+
+def test_nan_after_chunk_boundary_writes_floats():
+    raw = b"a,b\n1,x\n2,y\n,z\n4,w\n"
+    assert _convert(raw, "t.csv", "CSV", chunksize=2) == b"a,b\n1.0,x\n2.0,y\n,z\n4.0,w\n"
+
+
+@pytest.mark.parametrize("to_format", ["CSV", "JSON"])
+def test_jsonl_chunks_match_whole_file(to_format):
+    raw = b'{"a": 1, "b": true}\n{"a": 2, "b": false}\n{"a": null, "b": null}\n'
+    whole = _convert(raw, "t.jsonl", to_format, chunksize=10**6)
+    assert _convert(raw, "t.jsonl", to_format, chunksize=2) == whole
+
+
+@pytest.mark.parametrize("to_format", ["CSV", "JSON"])
+def test_xlsx_chunks_match_whole_file(to_format):
+    from openpyxl import Workbook
+
+    wb = Workbook()
+    ws = wb.active
+    for row in (["a", "b"], [1, "x"], [2, "y"], [None, 3], [4, "w"]):
+        ws.append(row)
+    buf = io.BytesIO()
+    wb.save(buf)
+    whole = _convert(buf.getvalue(), "t.xlsx", to_format, chunksize=10**6)
+    assert _convert(buf.getvalue(), "t.xlsx", to_format, chunksize=2) == whole
+
+
+def test_xlsx_date_column_survives_blank_chunk():
+    import datetime
+
+    from openpyxl import Workbook
+
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["a", "b"])
+    for day, b in ((1, 1), (2, 2), (None, 3), (None, 4), (5, 5)):
+        ws.append([datetime.datetime(2020, 1, day) if day else None, b])
+    buf = io.BytesIO()
+    wb.save(buf)
+    whole = _convert(buf.getvalue(), "t.xlsx", "CSV", chunksize=10**6)
+    assert whole.startswith(b"a,b\n2020-01-01,1\n")
+    assert _convert(buf.getvalue(), "t.xlsx", "CSV", chunksize=2) == whole
+
+
+def _convert_with(raw: bytes, name: str, to_format: str, engine: str, chunksize: int = 2) -> bytes:
+    src = io.BytesIO(raw)
+    src.name = name
+    out = io.BytesIO()
+    convert_stream(to_format, src, out, chunksize=chunksize, engine=engine)
+    return out.getvalue()
+
+
+def _read_parquet(data: bytes):
+    import pyarrow.parquet as pq
+
+    return pq.read_table(io.BytesIO(data))
+
+
+@pytest.mark.parametrize("engine", ["pandas", "pyarrow"])
+def test_parquet_column_empty_then_text(engine):
+    table = _read_parquet(_convert_with(b"a,b\n1,\n2,\n3,x\n4,y\n", "t.csv", "PARQUET", engine))
+    # Arrow's CSV reader keeps empty strings as "", pandas as NaN
+    assert [v or None for v in table.column("b").to_pylist()] == [None, None, "x", "y"]
+
+
+def test_arrow_csv_type_change_after_first_block(monkeypatch):
+    import tools.data_fomat_converter_tool as tool
+
+    monkeypatch.setattr(tool, "_ARROW_BLOCK_BYTES", 256)
+    raw = ("a,b\n" + "".join(f"{i},{i}\n" for i in range(80)) + "hello,2.5\n").encode()
+    table = _read_parquet(_convert_with(raw, "t.csv", "PARQUET", "pyarrow"))
+    assert str(table.schema.field("a").type) == "string"
+    assert str(table.schema.field("b").type) == "double"
+    assert table.column("a").to_pylist()[-1] == "hello"
+
+
+def test_arrow_jsonl_type_change_after_first_block(monkeypatch):
+    import tools.data_fomat_converter_tool as tool
+
+    monkeypatch.setattr(tool, "_ARROW_BLOCK_BYTES", 256)
+    raw = ("".join(f'{{"a": {i}}}\n' for i in range(40)) + '{"a": "x"}\n').encode()
+    table = _read_parquet(_convert_with(raw, "t.jsonl", "PARQUET", "pyarrow"))
+    assert table.column("a").to_pylist()[-1] == "x"
+
+
+@pytest.mark.parametrize("to_format", ["CSV", "TXT"])
+def test_arrow_header_only_csv_keeps_header(to_format):
+    out = _convert_with(b"a,b\n", "t.csv", to_format, "pyarrow")
+    assert out.replace(b"\t", b",") == b"a,b\n"
+
+
+MIXED_CSV = (
+    b"d,ts,flag,maybe,n,gap,f,text,a,a,\n"
+    b"2020-01-01,2020-01-01 10:00:00,true,True,1,1,1.0,x,1,2,u\n"
+    b"2020-01-02,2020-01-01T11:30:00,False,,2,,2.5,NA,3,4,v\n"
+    b"2020-01-03,2021-06-01 00:00:00,TRUE,false,3,5,1e-05,,5,6,\n"
+)
+
+
+def _xlsx_values(data: bytes):
+    from openpyxl import load_workbook
+
+    ws = load_workbook(io.BytesIO(data), read_only=True).active
+    return [list(row) for row in ws.values]
+
+
+def _engines_agree(raw: bytes, name: str, to_format: str, chunksize: int = 2):
+    outs = [_convert_with(raw, name, to_format, e, chunksize) for e in ("pandas", "pyarrow")]
+    if to_format == "XLSX":  # the zip carries a creation time
+        outs = [_xlsx_values(o) for o in outs]
+    assert outs[0] == outs[1]
+
+
+@pytest.mark.parametrize("to_format", ["CSV", "TXT", "JSON", "JSONL", "XLSX"])
+@pytest.mark.parametrize("block", [None, 128])
+def test_engines_write_the_same_output(to_format, block, monkeypatch):
+    import tools.data_fomat_converter_tool as tool
+
+    if block:  # several Arrow blocks, so the type check pass runs too
+        monkeypatch.setattr(tool, "_ARROW_BLOCK_BYTES", block)
+    _engines_agree(MIXED_CSV * 1, "t.csv", to_format)
+    _engines_agree(MIXED_CSV.replace(b",", b"\t"), "t.txt", to_format)
+
+
+@pytest.mark.parametrize("to_format", ["CSV", "JSON"])
+def test_engines_agree_on_types_settled_late(to_format, monkeypatch):
+    import tools.data_fomat_converter_tool as tool
+
+    monkeypatch.setattr(tool, "_ARROW_BLOCK_BYTES", 64)
+    rows = "".join(f"{i},{i},,\n" for i in range(40))
+    raw = f"a,b,c,d\n{rows}x,,true,2\n".encode()
+    _engines_agree(raw, "t.csv", to_format)
+
+
+def test_arrow_settles_widened_columns_in_one_extra_pass(monkeypatch):
+    import pyarrow.csv as pa_csv
+
+    import tools.data_fomat_converter_tool as tool
+
+    opened = []
+    open_csv = pa_csv.open_csv
+    monkeypatch.setattr(pa_csv, "open_csv", lambda *a, **k: opened.append(1) or open_csv(*a, **k))
+    rows = "".join(f"{i},{i}, {i},,\n" for i in range(40))
+    raw = f"a,b,c,d,e\n{rows}x,,1.5,true,1\n".encode()
+    read = pa_csv.ReadOptions(block_size=64)
+    types = tool._csv_column_types(raw, read, pa_csv.ParseOptions(), full=True)
+    assert {k: str(v) for k, v in types.items()} == {
+        "a": "string", "b": "double", "c": "double", "d": "bool", "e": "double"
+    }
+    assert len(opened) == 2  # the failed typed read, then one read as text
+
+
+def test_chunks_that_agree_are_parsed_once(monkeypatch):
+    import tools.data_fomat_converter_tool as tool
+
+    calls = []
+    read_csv = tool.pd.read_csv
+    monkeypatch.setattr(tool.pd, "read_csv", lambda *a, **k: calls.append(k) or read_csv(*a, **k))
+    raw = b"a,b\n" + b"".join(b"%d,x%d\n" % (i, i) for i in range(10))
+    assert _convert(raw, "t.csv", "CSV", chunksize=3) == raw
+    assert len(calls) == 1  # replayed, not re-read
+    calls.clear()
+    _convert(b"a,b\n1,x\n2,y\n,z\n4,w\n", "t.csv", "CSV", chunksize=2)
+    assert len(calls) == 2 and calls[1]["dtype"] == {}
+
+
+@pytest.mark.parametrize("to_format", ["CSV", "JSON"])
+def test_engines_agree_on_xlsx_and_jsonl(to_format):
+    import datetime
+
+    from openpyxl import Workbook
+
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["when", "n"])
+    ws.append([datetime.datetime(2020, 1, 1), 1.0])
+    ws.append([datetime.datetime(2020, 1, 2, 3, 4), 2.5])
+    buf = io.BytesIO()
+    wb.save(buf)
+    _engines_agree(buf.getvalue(), "t.xlsx", to_format)
+    _engines_agree(b'{"date": "2020-01-01", "d": "2020-01-02", "n": 1.0}\n', "t.jsonl", to_format)
+
+
+def _records_frame():
+    import datetime
+
+    import numpy as np
+    import pandas as pd
+
+    return pd.DataFrame(
+        {
+            "f": [0.1, 1 / 3, 1e20, 1e-20, -2.5, np.nan, np.inf, 123456789.123456789],
+            "i": [1, 2, 3, 4, 5, 6, 7, 8],
+            "when": pd.to_datetime(
+                ["2020-01-01", None, "1969-12-31 23:59:59.9995"] + ["2021-06-01"] * 5, format="ISO8601"
+            ),
+            "tz": pd.date_range("2020-03-01", periods=8, freq="7h", tz="Europe/Berlin"),
+            "gap": pd.to_timedelta([1.5, None, -0.0005, 2, 3, 4, 5, 6], unit="s"),
+            "b": [True, False, None, True, False, True, None, False],
+            "s": ["x", None, "ü/é", "", "a\"b", "\n", "NaN", "1"],
+            "nested": [[1, 2.5], {"k": None}, None, [], {}, [{"d": 1}], "t", 1.5],
+            "date": [datetime.date(2020, 1, i + 1) for i in range(8)],
+        }
+    )
+
+
+@pytest.mark.parametrize("pretty", [True, False])
+def test_json_records_match_to_json(pretty):
+    import json
+
+    import tools.data_fomat_converter_tool as tool
+
+    df = _records_frame()
+    records = json.loads(df.to_json(orient="records"))
+    if pretty:
+        expected = json.dumps(records, indent=4, ensure_ascii=False)
+    else:
+        expected = json.dumps(records, ensure_ascii=False, separators=(",", ":"))
+    out = io.BytesIO()
+    tool._write_json(iter([df.iloc[:3], df.iloc[3:]]), out, pretty)
+    assert out.getvalue().decode("utf-8") == expected
+
+
+def test_json_records_need_unique_columns():
+    import pandas as pd
+
+    import tools.data_fomat_converter_tool as tool
+
+    df = pd.DataFrame([[1, 2]], columns=["a", "a"])
+    with pytest.raises(ValueError, match="columns must be unique"):
+        list(tool.iter_records(df))
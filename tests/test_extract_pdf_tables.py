@@ -0,0 +1,131 @@
+import io
+
+import pandas as pd
+import pytest
+
+from tools.extract_pdf_tables_tool import _CsvSink, iter_pdf_tables, parse_page_ranges
+
+
+def _table_pdf(n_pages, rows=3):
+    """A PDF with one ruled two-column table per page; every third page has other headers."""
+    objs = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for p in range(1, n_pages + 1):
+        head = ("key", "count") if p % 3 == 0 else ("name", "value")
+        cells = [head] + [(f"r{p}-{i}", str(p * 10 + i)) for i in range(rows)]
+        ops = []
+        for i, (a, b) in enumerate(cells):
+            y = 680 - 20 * i
+            ops += [
+                f"72 {y} 100 20 re S",
+                f"172 {y} 100 20 re S",
+                f"BT /F1 10 Tf 76 {y + 6} Td ({a}) Tj ET",
+                f"BT /F1 10 Tf 176 {y + 6} Td ({b}) Tj ET",
+            ]
+        stream = "\n".join(ops).encode()
+        objs.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objs.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objs)
+        )
+        kids.append(b"%d 0 R" % len(objs))
+    objs[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), n_pages)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objs, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (i, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objs) + 1)
+    out += b"".join(b"%010d 00000 n \n" % o for o in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objs) + 1,
+        xref,
+    )
+    return bytes(out)
+
+
+def test_open_range_is_clamped_to_document():
+    assert parse_page_ranges("38-", 40) == [38, 39, 40]
+    assert parse_page_ranges("1-2,100-", 40) == [1, 2]
+
+
+@pytest.mark.parametrize("spec", ["100-", "50", [90]])
+def test_selection_past_the_end_names_page_count(spec):
+    with pytest.raises(ValueError, match=r"No pages selected \(document has 40 pages\)"):
+        parse_page_ranges(spec, 40)
+
+
+def test_reversed_range_is_invalid():
+    with pytest.raises(ValueError, match="Invalid page range '5-3'"):
+        parse_page_ranges("5-3", 40)
+
+
+class _FakePage:
+    page_obj = None  # no content streams: the pre-scan lets extract_tables decide
+
+    def extract_tables(self):
+        return [[["a"], ["1"]]]
+
+    def close(self):
+        pass
+
+
+def test_rss_guard_counts_growth_from_start(monkeypatch):
+    import tools.extract_pdf_tables_tool as tool
+
+    mb = 1024 * 1024
+    monkeypatch.setattr(tool, "_rss_bytes", lambda: 4000 * mb)
+    # a busy process that grew by 50 MB is within a 100 MB guard
+    assert tool._page_tables(_FakePage(), 1, 100, base_rss=3950 * mb) == [[["a"], ["1"]]]
+    with pytest.raises(MemoryError, match="more than 100 MB at page 2"):
+        tool._page_tables(_FakePage(), 2, 100, base_rss=3800 * mb)
+
+
+@pytest.mark.parametrize("include_page_col", [True, False])
+def test_parallel_extraction_matches_serial(include_page_col):
+    data = _table_pdf(14)
+    serial = list(iter_pdf_tables(data, include_page_col, workers=1))
+    assert len(serial) == 2
+    assert serial[0][1].startswith(b"page,name,value" if include_page_col else b"name,value")
+    assert list(iter_pdf_tables(data, include_page_col, workers=3)) == serial
+    assert list(iter_pdf_tables(data, include_page_col, workers=3, pages="2-9")) == list(
+        iter_pdf_tables(data, include_page_col, workers=1, pages="2-9")
+    )
+
+
+def _sink_csv(cols, rows):
+    sink = _CsvSink(cols)
+    for r in rows:
+        sink.write(r)
+    return sink.finish()
+
+
+def _pandas_csv(cols, rows):
+    out = io.BytesIO()
+    pd.DataFrame(rows, columns=cols).to_csv(out, index=False)
+    return out.getvalue()
+
+
+def test_csv_sink_matches_dataframe_to_csv():
+    cols = ["page", "name", "", "note"]
+    rows = [
+        [1, "a", "1", "plain"],
+        [1, None, "", 'say "hi", then\nleave'],
+        [2, "ü, ß", " 2 ", None],
+        [3, "short"],  # padded with empty cells, as the DataFrame did
+    ]
+    assert _sink_csv(cols, rows) == _pandas_csv(cols, rows)
+    assert _sink_csv(cols, []) == _pandas_csv(cols, [])
+
+
+def test_csv_sink_rejects_rows_longer_than_header():
+    sink = _CsvSink(["a", "b"])
+    with pytest.raises(ValueError, match="2 columns passed, passed data had 3 columns"):
+        sink.write([1, 2, 3])
+    sink.discard()
@@ -0,0 +1,86 @@
+import pickle
+import threading
+import time
+from io import BytesIO
+
+import pytest
+
+from tools.helpers import SharedBytes, SharedFile, run_batch
+from tools.result_cache import cached
+
+
+def _upper(params: dict) -> dict:
+    params["text"] = params["text"].upper()  # fails on non-strings
+    return params
+
+
+@cached("test_echo", normalize=_upper)
+def echo(text):
+    return text.upper()
+
+
+def checksum(data, delay=0.0):
+    time.sleep(delay)
+    if isinstance(data, BytesIO):
+        data = data.name.encode() + data.getvalue()
+    if not data:
+        raise ValueError("empty input")
+    return sum(data) % 65521, len(data)
+
+
+@pytest.mark.parametrize("kind", ["thread", "process"])
+def test_results_come_back_in_job_order(kind):
+    # later jobs finish first; big ones go through shared memory
+    payloads = [b"\x01" * 300_000, b"ab", b"\x02" * 70_000, b"c"]
+    delays = [0.3, 0.2, 0.1, 0.0]
+    jobs = list(zip(payloads, delays))
+    assert run_batch(checksum, jobs, kind=kind) == [
+        (checksum(p), None) for p in payloads
+    ]
+
+
+@pytest.mark.parametrize("kind", ["thread", "process"])
+def test_errors_are_reported_per_job(kind):
+    upload = BytesIO(b"x" * 10)
+    upload.name = "u.png"
+    results = run_batch(checksum, [(b"a",), (b"",), (upload,), (b"",)], kind=kind)
+    assert results[0] == (checksum(b"a"), None)
+    assert results[2] == (checksum(upload), None)
+    for result, err in (results[1], results[3]):
+        assert result is None
+        assert isinstance(err, ValueError) and str(err) == "empty input"
+
+
+def test_progress_is_reported_from_the_calling_thread():
+    calls = []
+    caller = threading.get_ident()
+
+    def on_progress(done, total):
+        assert threading.get_ident() == caller
+        calls.append((done, total))
+
+    run_batch(checksum, [(b"a", 0.05), (b"b",), (b"c", 0.1)], on_progress=on_progress)
+    assert calls == [(0, 3), (1, 3), (2, 3), (3, 3)]
+
+
+def test_bad_cache_key_fails_only_its_job():
+    results = run_batch(echo, [("a",), (None,), ("b",)], kind="process")
+    assert results[0] == ("A", None)
+    assert results[1][0] is None and isinstance(results[1][1], AttributeError)
+    assert results[2] == ("B", None)
+
+
+def test_shared_bytes_as_file_reads_in_place():
+    data = bytes(range(256)) * 300
+    shared = SharedBytes(data, name="t.pdf", as_file=True)
+    try:
+        f = pickle.loads(pickle.dumps(shared)).load()
+        assert isinstance(f, SharedFile) and f.name == "t.pdf"
+        assert f.read(4) == data[:4]
+        f.seek(-3, 2)
+        assert f.read() == data[-3:]
+        f.seek(0)
+        assert f.read() == data
+        f.close()
+    finally:
+        shared.release()
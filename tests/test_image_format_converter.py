@@ -0,0 +1,203 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from tools.image_format_converter_tool import (
+    _MAX_FINAL_ENCODES,
+    _TARGET_TOLERANCE,
+    _encode,
+    _encode_to_size,
+    image_format_converter,
+    image_variants,
+)
+
+
+def _png_i16(width: int, height: int, noise: bool = False) -> bytes:
+    if noise:
+        pixels = np.random.default_rng(0).integers(0, 65536, (height, width), dtype=np.uint16)
+    else:
+        pixels = (np.arange(width * height).reshape(height, width) * 37 % 65536).astype(np.uint16)
+    img = Image.fromarray(pixels)
+    assert img.mode == "I;16"
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+@pytest.mark.parametrize("to_format", ["png", "jpeg", "webp"])
+def test_i16_png_downscales(to_format):
+    _, data, img = image_format_converter(to_format, _png_i16(1200, 800), 300, flatten_bg="white")
+    assert img.size == (300, 200)
+    assert Image.open(io.BytesIO(data)).size == (300, 200)
+
+
+def test_i16_png_variants():
+    out = image_variants(_png_i16(1200, 800), [("png", 300), ("webp", 150)], flatten_bg="white")
+    assert [(fmt, width) for fmt, width, _ in out] == [("png", 300), ("webp", 150)]
+
+
+def test_i16_png_preview():
+    from tools.image_format_converter_tool import convert_with_preview
+
+    fmt, data, preview, size = convert_with_preview(
+        "png", _png_i16(2000, 1000, noise=True), 0, flatten_bg="white"
+    )
+    assert size == (2000, 1000)
+    assert Image.open(io.BytesIO(preview)).size == (300, 150)
+
+
+def test_preview_failure_is_none():
+    from tools.helpers import make_preview
+
+    class Broken:
+        mode = "RGB"
+        info = {}
+        width = height = 1000
+
+        def resize(self, *args, **kwargs):
+            raise OSError("decoder error")
+
+    assert make_preview(Broken(), b"x" * (1 << 20), "png") is None
+
+
+def _mandelbrot(noise: float) -> Image.Image:
+    base = np.asarray(Image.effect_mandelbrot((400, 300), (-2, -1.2, 1, 1.2), 80).convert("RGB"))
+    pixels = base * 0.7 + np.random.default_rng(0).normal(0, noise, base.shape)
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+@pytest.mark.parametrize("src_format", ["JPEG", "PNG"])
+def test_variants_match_separate_conversions(src_format):
+    from tools.image_format_converter_tool import _DEFAULT_QUALITY
+
+    buf = io.BytesIO()
+    _mandelbrot(5).save(buf, format=src_format)
+    raw = buf.getvalue()
+    targets = [
+        ("webp", 0),
+        ("jpeg", 300),
+        ("png", 200),
+        ("jpeg", 300, _DEFAULT_QUALITY["JPEG"]),
+        ("webp", 100),
+    ]
+    variants = image_variants(raw, targets)
+    assert variants[3] == variants[1]  # an explicit default quality changes nothing
+    for (fmt, width, *_), (v_fmt, v_width, v_data) in zip(targets, variants):
+        s_fmt, s_data, s_img = image_format_converter(fmt, raw, width)
+        assert (v_fmt, v_width) == (s_fmt, s_img.width)
+        if width in (0, 300):  # the original, and sizes resampled from it
+            assert v_data == s_data
+            continue
+        # smaller sizes are resampled from the next larger one instead
+        v_px, s_px = (
+            np.asarray(Image.open(io.BytesIO(d)).convert("RGB"), dtype=np.int16)
+            for d in (v_data, s_data)
+        )
+        assert v_px.shape == s_px.shape
+        assert np.abs(v_px - s_px).mean() < 2
+
+
+EFFORT_SAVE_PARAMS = {
+    ("PNG", "fast"): dict(compress_level=1),
+    ("PNG", "balanced"): dict(compress_level=6),
+    ("PNG", "smallest"): dict(optimize=True),
+    ("WEBP", "fast"): dict(method=0),
+    ("WEBP", "balanced"): dict(method=4),
+    ("WEBP", "smallest"): dict(method=6),
+    ("JPEG", "fast"): dict(subsampling="4:4:4"),
+    ("JPEG", "balanced"): dict(subsampling="4:4:4", optimize=True),
+    ("JPEG", "smallest"): dict(subsampling="4:4:4", progressive=True, optimize=True),
+    ("HEIF", "fast"): dict(enc_params={"preset": "ultrafast"}),
+    ("HEIF", "balanced"): dict(enc_params={"preset": "medium"}),
+    ("HEIF", "smallest"): {},
+}
+_EFFORT_KEYS = {"compress_level", "optimize", "method", "subsampling", "progressive", "enc_params"}
+
+
+@pytest.mark.parametrize("fmt,effort", list(EFFORT_SAVE_PARAMS))
+def test_effort_presets_reach_the_encoder(fmt, effort, monkeypatch):
+    raw = _png_i16(64, 48)
+    saved = []
+    save = Image.Image.save
+
+    def capture(self, fp, format=None, **params):
+        saved.append((format, params))
+        return save(self, fp, format=format, **params)
+
+    monkeypatch.setattr(Image.Image, "save", capture)
+    image_format_converter(fmt.lower(), raw, effort=effort.upper())
+    [(format, params)] = saved
+    assert format == fmt
+    assert {k: v for k, v in params.items() if k in _EFFORT_KEYS} == EFFORT_SAVE_PARAMS[fmt, effort]
+
+
+def _best_fit(img, fmt: str, target: int) -> int:
+    sizes = [len(_encode(img, fmt, q, "smallest")) for q in range(1, 101)]
+    return max(n for n in sizes if n <= target)
+
+
+def _count_encodes(monkeypatch):
+    import tools.image_format_converter_tool as tool
+
+    calls = []
+
+    def counting(img, fmt, quality=None, effort="smallest"):
+        calls.append(effort)
+        return _encode(img, fmt, quality, effort)
+
+    monkeypatch.setattr(tool, "_encode", counting)
+    return calls
+
+
+@pytest.mark.parametrize("fmt,target", [("JPEG", 5000), ("JPEG", 9000), ("WEBP", 2000), ("WEBP", 4000)])
+def test_target_bytes_fits_within_tolerance(fmt, target, monkeypatch):
+    img = _mandelbrot(5)
+    best = _best_fit(img, fmt, target)
+    calls = _count_encodes(monkeypatch)
+    data = _encode_to_size(img, fmt, target)
+    assert len(data) <= target
+    # within the tolerance band of the best fit, give or take the last
+    # prediction's drift
+    assert len(data) >= min(best, target) * (1 - 2 * _TARGET_TOLERANCE)
+    assert calls.count("smallest") <= _MAX_FINAL_ENCODES
+
+
+def test_target_bytes_when_nothing_fits_at_fast_effort():
+    img = _mandelbrot(5)
+    target = 3800
+    assert len(_encode(img, "JPEG", 1, "fast")) > target  # search starts from quality 1
+    data = _encode_to_size(img, "JPEG", target)
+    assert len(data) <= target
+    assert len(data) >= 0.9 * _best_fit(img, "JPEG", target)
+
+
+def test_target_bytes_below_lowest_quality_returns_it():
+    img = _mandelbrot(5)
+    assert _encode_to_size(img, "JPEG", 1000) == _encode(img, "JPEG", 1, "smallest")
+
+
+def test_noisy_jpeg_encodes_with_optimize():
+    data = _encode(_mandelbrot(60), "JPEG", 90, "smallest")
+    assert len(data) > 400 * 300  # past Pillow's 1 byte/pixel buffer
+
+
+def test_cache_keeps_encoded_bytes_only(monkeypatch):
+    import pickle
+
+    import tools.image_format_converter_tool as tool
+    from tools.result_cache import ResultCache
+
+    cache = ResultCache(memory_bytes=1 << 20)
+    monkeypatch.setattr(tool.image_format_bytes, "cache", cache)
+    raw = _png_i16(120, 80)
+
+    fmt, data, img = image_format_converter("webp", raw)
+    key = tool.image_format_bytes.cache_key("webp", raw)
+    assert pickle.loads(cache.memory.get(key)) == (fmt, data)  # no PIL image
+
+    monkeypatch.setattr(tool, "_convert", None)  # a hit must not convert again
+    again = image_format_converter("WEBP", raw)
+    assert again[:2] == (fmt, data)
+    assert again[2].size == img.size
@@ -0,0 +1,95 @@
+import io
+import pickle
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+from tools.result_cache import ResultCache
+
+rb = pytest.importorskip("tools.remove_bg_tool")
+
+
+def test_cache_keeps_png_bytes_only(monkeypatch):
+    cut = Image.new("RGBA", (640, 480), (255, 0, 0, 128))
+    buf = io.BytesIO()
+    cut.save(buf, format="PNG")
+    png = buf.getvalue()
+    calls = []
+
+    def fake_remove_bg(raw_bytes, *opts):
+        calls.append(raw_bytes)
+        return png, cut
+
+    cache = ResultCache(memory_bytes=1 << 20)
+    monkeypatch.setattr(rb, "_remove_bg", fake_remove_bg)
+    monkeypatch.setattr(rb.remove_bg_png, "cache", cache)
+
+    first_png, first_img = rb.remove_bg(b"input")
+    assert (first_png, first_img) == (png, cut)
+    key = rb.remove_bg_png.cache_key(b"input")
+    assert pickle.loads(cache.memory.get(key)) == png  # no PIL image in the cache
+
+    again_png, again_img = rb.remove_bg(b"input")
+    assert calls == [b"input"]
+    assert again_png == png
+    assert again_img.size == cut.size and again_img.mode == "RGBA"
+
+
+def _slow_session_class(loads, fail=False):
+    class FakeSession:
+        inner_session = None
+
+        def __init__(self, model_name, options):
+            loads.append(model_name)
+            time.sleep(0.2)  # long enough for every caller to be waiting
+            if fail:
+                raise RuntimeError("model download failed")
+
+    return lambda model_name, cfg: FakeSession
+
+
+def _get_concurrently(n: int):
+    barrier = threading.Barrier(n)
+    results = [None] * n
+
+    def run(i):
+        barrier.wait()
+        try:
+            results[i] = rb.get_session("u2netp")
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_concurrent_first_requests_share_one_load(monkeypatch):
+    loads = []
+    monkeypatch.setattr(rb, "_sessions", rb._SessionManager(1 << 30))
+    monkeypatch.setattr(rb, "_session_class", _slow_session_class(loads))
+
+    sessions = _get_concurrently(8)
+    assert loads == ["u2netp"]
+    assert all(s is sessions[0] for s in sessions)
+    assert rb.get_session("u2netp") is sessions[0]
+    assert loads == ["u2netp"]
+
+
+def test_failed_load_reaches_every_waiter_and_is_retried(monkeypatch):
+    loads = []
+    monkeypatch.setattr(rb, "_sessions", rb._SessionManager(1 << 30))
+    monkeypatch.setattr(rb, "_session_class", _slow_session_class(loads, fail=True))
+
+    errors = _get_concurrently(4)
+    assert loads == ["u2netp"]
+    assert all(isinstance(e, RuntimeError) for e in errors)
+    # nothing is left cached or in flight: the next call loads again
+    monkeypatch.setattr(rb, "_session_class", _slow_session_class(loads))
+    assert rb.get_session("u2netp") is not None
+    assert loads == ["u2netp", "u2netp"]
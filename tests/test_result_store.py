@@ -0,0 +1,16 @@
+from components.result_store import PIN_MAX_BYTES, ResultStore
+
+
+def test_pinned_preview_stays_resident(tmp_path):
+    store = ResultStore(session_bytes=1000, total_bytes=10**6, ttl=60, spill_root=str(tmp_path))
+    preview = store.put("s", b"p" * 100, pin=True)
+    blob = store.put("s", b"b" * 950)
+    assert store.resident(preview)
+    assert not store.resident(blob)
+    assert store.get(blob) == b"b" * 950
+
+
+def test_pin_ignored_above_cap(tmp_path):
+    store = ResultStore(session_bytes=1000, total_bytes=10**6, ttl=60, spill_root=str(tmp_path))
+    big = store.put("s", b"x" * (PIN_MAX_BYTES + 1), pin=True)
+    assert not store.resident(big)
@@ -0,0 +1,108 @@
+import shutil
+import threading
+
+import pytest
+
+import tools.helpers as helpers
+
+pytestmark = pytest.mark.skipif(not helpers.have_node(), reason="needs Node.js")
+
+# stand-ins for the npm packages, so the real png2svg_tool.mjs --serve loop
+# runs without them; the "traced" SVG just echoes the payload
+_STUBS = {
+    "sharp": """
+import fs from 'node:fs';
+export default function sharp(input) {
+    const text = input.toString('latin1');
+    if (text === 'crash') process.exit(1);
+    if (text.startsWith('crash-once:')) {
+        const marker = text.slice('crash-once:'.length);
+        if (!fs.existsSync(marker)) { fs.writeFileSync(marker, ''); process.exit(1); }
+    }
+    const chain = new Proxy({}, {
+        get: (_, name) => name === 'toBuffer'
+            ? async () => ({ data: input, info: { width: input.length, height: 1 } })
+            : () => chain,
+    });
+    return chain;
+}
+""",
+    "imagetracerjs": """
+export default {
+    imagedataToSVG(imgd, opts) {
+        const text = Buffer.from(imgd.data).toString('latin1');
+        if (text === 'fail') throw new Error('cannot trace');
+        return `<svg colors="${opts.numberofcolors}">${text}</svg>`;
+    },
+};
+""",
+    "svgo": "export function optimize(svg) { return { data: svg }; }\n",
+}
+
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch):
+    for name, src in _STUBS.items():
+        pkg = tmp_path / "node_modules" / name
+        pkg.mkdir(parents=True)
+        (pkg / "package.json").write_text(
+            f'{{"name": "{name}", "type": "module", "main": "index.js"}}'
+        )
+        (pkg / "index.js").write_text(src)
+    mjs = tmp_path / "png2svg_tool.mjs"
+    shutil.copy(helpers.path_convert_mjs(), mjs)
+    monkeypatch.setattr(helpers, "path_convert_mjs", lambda: str(mjs))
+    pool = helpers._NodeTracePool(2)
+    yield pool
+    pool.shutdown()
+
+
+def _svg(payload: bytes, colors: int = 4) -> bytes:
+    return b'<svg colors="%d">%s</svg>' % (colors, payload)
+
+
+def test_frames_round_trip(pool):
+    assert pool.trace(b"abc", {"layers": 4}) == _svg(b"abc")
+    assert pool.trace(b"", {"layers": 3}) == _svg(b"", 3)
+    # bigger than a pipe buffer: arrives and leaves in many chunks
+    big = b"0123456789abcdef" * 200_000
+    assert pool.trace(big, {"layers": 4}) == _svg(big)
+
+
+def test_concurrent_requests_get_their_own_answers(pool):
+    results = {}
+
+    def run(i):
+        results[i] = pool.trace(b"job-%d" % i * (1000 * i + 1), {"layers": 4})
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == {i: _svg(b"job-%d" % i * (1000 * i + 1)) for i in range(8)}
+    assert pool._started == 2
+
+
+def test_crashed_worker_is_restarted_and_retried(pool, tmp_path):
+    marker = tmp_path / "crashed"
+    payload = b"crash-once:%s" % str(marker).encode()
+    assert pool.trace(payload, {"layers": 4}) == _svg(payload)
+    assert marker.exists()
+    # the worker that took over still serves the next request
+    assert pool.trace(b"after", {"layers": 4}) == _svg(b"after")
+
+
+def test_worker_that_keeps_crashing_fails_the_request(pool):
+    with pytest.raises(RuntimeError, match="imagetracer failed"):
+        pool.trace(b"crash", {"layers": 4})
+    assert pool.trace(b"ok", {"layers": 4}) == _svg(b"ok")
+
+
+def test_trace_error_is_reported_without_restart(pool):
+    assert pool.trace(b"first", {"layers": 4}) == _svg(b"first")
+    (worker,) = pool._all
+    pid = worker.proc.pid
+    with pytest.raises(RuntimeError, match="imagetracer failed"):
+        pool.trace(b"fail", {"layers": 4})
+    assert worker.alive() and worker.proc.pid == pid
@@ -1,52 +1,893 @@
 # data_format_converter_tool.py
-from typing import Tuple
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
 import pandas as pd
 import io
+import re
 import json
+import math
+import decimal
+import datetime
+import pickle
+import tempfile
+import itertools
+import numpy as np
+from openpyxl import load_workbook
+from openpyxl.reader.excel import ExcelReader
+from openpyxl.worksheet._read_only import ReadOnlyWorksheet
 
-_WRITABLE = {"TXT", "CSV", "JSON", "XLSX"}
+from tools.helpers import input_bytes, open_input
+from tools.result_cache import cached
 
+_WRITABLE = {"TXT", "CSV", "JSON", "JSONL", "XLSX", "PARQUET", "FEATHER"}
 
-def data_format_converter(to_format: str = "CSV", file=None) -> Tuple[str, bytes]:
-    if to_format.upper() not in _WRITABLE:
-        raise ValueError(f"Unsupported format: {to_format}")
+# "pandas": pandas' parsers, chunked. "pyarrow": Arrow's multithreaded CSV
+# reader and Arrow-native Parquet/Feather writing. Both give the same output.
+ENGINES = ("pandas", "pyarrow")
+
+# rows per DataFrame chunk while streaming CSV/TXT/JSONL inputs
+CHUNK_ROWS = 100_000
+
+# output being written (and chunks kept for replay) stays in memory up to
+# this size, then spills to disk; callers wanting bytes still get the whole
+# output back in memory at the end
+_SPOOL_MAX_BYTES = 32 * 1024 * 1024
+
+_XLSX_MAX_ROWS = 1_048_576
+
+# bytes per Arrow read block (the pyarrow engine's "chunk")
+_ARROW_BLOCK_BYTES = 16 * 1024 * 1024
+
+
+def _normalize_params(params: dict) -> dict:
+    params["to_format"] = str(params["to_format"]).upper()
+    params.pop("chunksize", None)  # chunking doesn't change the output
+    if params["to_format"] != "JSON":
+        params.pop("pretty", None)
+    params["engine"] = str(params["engine"]).lower()
+    if not str(getattr(params["file"], "name", "")).lower().endswith(".xlsx"):
+        params.pop("sheet", None)
+    return params
 
-    name = getattr(file, "name", "converted")
-    ext = name.split(".")[-1].lower()
 
-    # --- Load file into DataFrame ---
-    if ext == "csv":
-        df = pd.read_csv(file)
+# ---------------- readers ----------------
+def iter_frames(
+    file, ext: str, chunksize: int = CHUNK_ROWS, sheet: Optional[Union[str, int]] = None
+) -> Iterator[pd.DataFrame]:
+    """DataFrames of at most `chunksize` rows (one frame for JSON arrays)."""
+    if ext in ("csv", "txt"):
+        opts = {} if ext == "csv" else {"delimiter": "\t", "header": None}
+        # exact float parsing, as Arrow's reader does; the default can be off by an ulp
+        opts["float_precision"] = "round_trip"
+        start = file.tell()
+
+        def read(dtypes):
+            file.seek(start)
+            if dtypes is None:
+                return pd.read_csv(file, chunksize=chunksize, **opts)
+            # text columns are parsed as text; casting after would give "1" -> 1
+            text = {c: t for c, t in dtypes.items() if t is str}
+            chunks = pd.read_csv(file, chunksize=chunksize, dtype=text, **opts)
+            return _cast(chunks, {c: t for c, t in dtypes.items() if t is not str})
+
+        yield from _settled(read, text=True)
+    elif ext == "jsonl":
+        start = file.tell()
+
+        def read(dtypes):
+            file.seek(start)
+            return pd.read_json(file, lines=True, chunksize=chunksize, dtype=dtypes)
+
+        yield from _settled(read)
     elif ext == "xlsx":
-        df = pd.read_excel(file)
+        wb = _open_workbook(file)
+        try:
+            yield from _iter_sheet(_pick_sheet(wb, sheet), chunksize)
+        finally:
+            wb.close()
     elif ext == "json":
-        df = pd.read_json(file)
-    elif ext == "txt":
-        df = pd.read_csv(file, delimiter="\t", header=None)
+        yield pd.read_json(file)
     else:
         raise ValueError(f"Unsupported input file type: {ext}")
 
-    output = io.BytesIO()
 
-    # --- Convert ---
-    if to_format.upper() == "CSV":
-        df.to_csv(output, index=False)
-        ext_out = "csv"
+# ---------------- chunk dtypes ----------------
+# Each pandas chunk infers its own dtypes, so a column whose first NaN (or
+# first text) comes after a chunk boundary would be int in some chunks and
+# float or object in others. Inputs of more than one chunk are read once to
+# work out the dtypes a whole-file read would give. The chunks of that read
+# are spooled (to disk past _SPOOL_MAX_BYTES) as long as they all agree, and
+# if they already have those dtypes they are replayed from the spool. Only
+# otherwise is the input read again, with the dtypes applied to every chunk.
+def _settled(read, text: bool = False) -> Iterator[pd.DataFrame]:
+    """Chunks of read(dtypes) with one dtype per column across all of them.
+
+    `read(None)` infers per chunk; `read(dtypes)` applies a {column: dtype}
+    map. `text` is for the C CSV parser, which keeps mixed columns as text:
+    those come back as `str` and must be applied at parse time.
+    """
+    chunks = read(None)
+    first = next(chunks, None)
+    if first is None:
+        return
+    second = next(chunks, None)
+    if second is None:
+        yield first
+        return
+    with tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX_BYTES) as spool:
+        agree = True
+
+        def spooled(frames):
+            nonlocal agree
+            for df in frames:
+                agree = agree and df.dtypes.equals(first.dtypes)
+                if agree:
+                    pickle.dump(df, spool, protocol=pickle.HIGHEST_PROTOCOL)
+                yield df
+
+        dtypes = _merge_dtypes(spooled(itertools.chain([first, second], chunks)), text)
+        if not (agree and _has_dtypes(first, dtypes)):
+            yield from read(dtypes)
+            return
+        end = spool.tell()
+        spool.seek(0)
+        while spool.tell() < end:
+            yield pickle.load(spool)
+
+
+def _has_dtypes(df: pd.DataFrame, dtypes: dict) -> bool:
+    # `str` is read as text, which the C parser gives as object columns
+    return all(
+        df[label].dtype == (np.dtype(object) if dtype is str else dtype)
+        for label, dtype in dtypes.items()
+    )
+
+
+def _cast(frames, dtypes: dict) -> Iterator[pd.DataFrame]:
+    for df in frames:
+        yield df.astype({c: t for c, t in dtypes.items() if c in df.columns})
+
+
+def _column_kind(col: pd.Series) -> str:
+    """One chunk's column: n(umeric), b(ool), o(ther), or "" if all NaN."""
+    if col.dtype == bool:
+        return "b"
+    if col.dtype.kind in "iuf" and isinstance(col.dtype, np.dtype):
+        return "n" if col.notna().any() else ""
+    inferred = pd.api.types.infer_dtype(col, skipna=True)
+    if inferred == "empty":
+        return ""
+    return "b" if inferred == "boolean" else "o"
+
+
+def _merge_dtypes(frames, text: bool) -> dict:
+    """The dtype per column that reading all of `frames` at once would give."""
+    kinds, numeric, nans, seen, others = {}, {}, set(), {}, {}
+    for df in frames:
+        for label, col in df.items():
+            seen.setdefault(label, col.dtype)
+            kind = _column_kind(col)
+            if kind == "":
+                nans.add(label)
+                continue
+            if col.hasnans:
+                nans.add(label)
+            kinds.setdefault(label, set()).add(kind)
+            if kind == "o":
+                others.setdefault(label, set()).add(col.dtype)
+            if kind in "nb":
+                dtype = col.dtype if kind == "n" else np.dtype("int64")
+                numeric[label] = np.result_type(numeric.get(label, dtype), dtype)
+    dtypes = {}
+    for label, first in seen.items():
+        found = kinds.get(label)
+        if not found:
+            dtypes[label] = first  # NaN throughout
+        elif found == {"b"} and label not in nans:
+            dtypes[label] = np.dtype(bool)
+        elif found == {"b"} and text:
+            dtypes[label] = np.dtype(object)  # the C parser keeps True/NaN/False
+        elif "o" not in found and not (text and "b" in found):
+            # numbers; for parsers of typed values bools count as 0/1
+            dtype = numeric[label]
+            dtypes[label] = np.dtype("float64") if label in nans and dtype.kind in "iub" else dtype
+        elif found == {"o"} and len(others[label]) == 1 and others[label] != {object}:
+            dtypes[label] = others[label].pop()  # e.g. dates, with blank chunks
+        else:
+            dtypes[label] = str if text else np.dtype(object)
+    return dtypes
+
+
+# ---------------- XLSX ----------------
+# openpyxl in read-only mode parses one worksheet's XML as rows are pulled,
+# so only the chosen sheet is read and only `chunksize` rows are held at a
+# time. Cells are converted the way pd.read_excel's openpyxl reader does.
+class _LazySheet(ReadOnlyWorksheet):
+    def _get_size(self):
+        # openpyxl scans each sheet's XML at load time for a <dimension> tag,
+        # which write-only workbooks (ours included) put at the end. The
+        # size isn't needed: _iter_sheet resets it and reads rows as they come.
+        pass
+
+
+class _WorkbookReader(ExcelReader):
+    """ExcelReader(read_only=True) that creates sheets without reading them."""
+
+    def read_worksheets(self):
+        for sheet, rel in self.parser.find_sheets():
+            if rel.target not in self.valid_files or "chartsheet" in rel.Type:
+                continue
+            ws = _LazySheet(self.wb, sheet.name, rel.target, self.shared_strings)
+            ws.sheet_state = sheet.state
+            self.wb._sheets.append(ws)
+
+
+# the two classes above override openpyxl internals (tested with the 3.1.5
+# pinned in requirements.txt); if those are gone, use the public loader
+_LAZY_SHEETS = hasattr(ReadOnlyWorksheet, "_get_size") and hasattr(ExcelReader, "read_worksheets")
+
+
+def _open_workbook(file):
+    if _LAZY_SHEETS:
+        try:
+            reader = _WorkbookReader(file, read_only=True, data_only=True, keep_links=False)
+            reader.read()
+            return reader.wb
+        except (AttributeError, TypeError):
+            pass  # internals changed shape; a bad file fails the same way below
+    return load_workbook(file, read_only=True, data_only=True, keep_links=False)
+
+
+def _pick_sheet(wb, sheet: Optional[Union[str, int]] = None):
+    """None -> first sheet; int -> 0-based index; str -> name, else 1-based number."""
+    sheets = wb.worksheets
+    if sheet is None or sheet == "":
+        return sheets[0]
+    if isinstance(sheet, str):
+        if sheet in wb.sheetnames:
+            return wb[sheet]
+        if not sheet.strip().isdigit():
+            raise ValueError(f"No sheet named {sheet!r}; sheets: {', '.join(wb.sheetnames)}")
+        sheet = int(sheet) - 1
+    if not 0 <= sheet < len(sheets):
+        raise ValueError(f"Sheet index {sheet} out of range ({len(sheets)} sheet(s))")
+    return sheets[sheet]
+
+
+_XLSX_ERRORS = frozenset(("#NULL!", "#DIV/0!", "#VALUE!", "#REF!", "#NAME?", "#NUM!", "#N/A"))
+
+
+def _xlsx_value(v):
+    if v is None:
+        return ""  # parsed as NaN, like read_excel
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    if isinstance(v, str) and v in _XLSX_ERRORS:
+        return np.nan  # error cells; values_only hands them back as text
+    return v
+
+
+def _sheet_frame(ws, header: list, rows: list, width: Optional[int], dtypes=None):
+    """Parse one chunk; the first chunk fixes the column count for the rest."""
+    from pandas.io.parsers import TextParser
+
+    if width is None:
+        width = max([len(header)] + [len(r) for r in rows])
+    elif any(len(r) > width for r in rows):
+        raise ValueError(f"Sheet {ws.title!r} has rows wider than its first {width} columns")
+    pad = [""]
+    data = [r + pad * (width - len(r)) for r in [header, *rows]]
+    parser = TextParser(data, header=0, skip_blank_lines=False, dtype=dtypes)
+    return parser.read(), width
+
+
+def _iter_sheet(ws, chunksize: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Frames of one worksheet, first row as header, trailing blank rows dropped."""
+    return _settled(lambda dtypes: _sheet_chunks(ws, chunksize, dtypes))
+
+
+def _sheet_chunks(ws, chunksize: int, dtypes=None) -> Iterator[pd.DataFrame]:
+    ws.reset_dimensions()  # don't trust the stored <dimension>
+    header, width = None, None
+    chunk, blanks = [], []
+    for values in ws.iter_rows(values_only=True):
+        row = [_xlsx_value(v) for v in values]
+        while row and row[-1] == "":
+            row.pop()
+        if header is None:
+            header = row
+            continue
+        if not row:
+            blanks.append(row)  # kept only if data follows
+            continue
+        chunk.extend(blanks)
+        blanks = []
+        chunk.append(row)
+        if len(chunk) >= chunksize:
+            df, width = _sheet_frame(ws, header, chunk, width, dtypes)
+            yield df
+            chunk = []
+    if header is None:
+        yield pd.DataFrame()
+    elif chunk or width is None:
+        yield _sheet_frame(ws, header, chunk, width, dtypes)[0]
+
+
+def iter_batches(
+    file, ext: str, chunksize: int = CHUNK_ROWS, sheet: Optional[Union[str, int]] = None
+):
+    """pyarrow RecordBatches of `file`; CSV/TXT stream block by block.
+
+    Arrow's CSV reader is set up to read values the way pd.read_csv does, so
+    the engine choice doesn't change the output. XLSX and JSON have no Arrow
+    reader that can match pandas (the NDJSON reader turns date strings into
+    timestamps, read_json keeps them by column name) and yield DataFrames.
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+
+    if ext not in ("csv", "txt"):
+        yield from iter_frames(file, ext, chunksize, sheet)
+        return
+    data = input_bytes(file)
+    read = pa_csv.ReadOptions(use_threads=True, block_size=_ARROW_BLOCK_BYTES)
+    if ext == "txt":
+        # headerless and tab-separated, columns named 0..n-1 like pandas
+        read.autogenerate_column_names = True
+    parse = pa_csv.ParseOptions(delimiter="," if ext == "csv" else "\t")
+    # one block is all the reader infers types from; past that, check them
+    types = _csv_column_types(data, read, parse, full=len(data) > _ARROW_BLOCK_BYTES)
+    reader = pa_csv.open_csv(
+        pa.BufferReader(pa.py_buffer(data)),  # zero-copy view
+        read_options=read,
+        parse_options=parse,
+        convert_options=_csv_convert_options(types),
+    )
+    names = _pandas_names(reader.schema.names)
+    empty = True
+    for batch in reader:
+        empty = False
+        yield _txt_frame(batch) if ext == "txt" else batch.rename_columns(names)
+    if empty:  # header only: still hand on the columns
+        yield pa.RecordBatch.from_pylist([], schema=reader.schema).rename_columns(names)
+
+
+def _txt_frame(batch) -> pd.DataFrame:
+    # Arrow names need to be strings; read_csv(header=None) numbers them 0..n-1
+    df = batch.to_pandas()
+    df.columns = range(df.shape[1])
+    return df
+
+
+_CSV_TRUE = ["True", "TRUE", "true"]
+_CSV_FALSE = ["False", "FALSE", "false"]
+
+
+def _csv_convert_options(types: dict):
+    """ConvertOptions that parse values like pd.read_csv's defaults."""
+    import pyarrow.csv as pa_csv
+    from pandas._libs.parsers import STR_NA_VALUES
+
+    return pa_csv.ConvertOptions(
+        column_types=types,
+        null_values=sorted(STR_NA_VALUES),
+        strings_can_be_null=True,  # "" and "NA" are NaN in text columns too
+        true_values=_CSV_TRUE,
+        false_values=_CSV_FALSE,
+    )
+
+
+def _pandas_names(names: List[str]) -> List[str]:
+    """CSV header names as pd.read_csv gives them: blanks become "Unnamed: i",
+    repeats "a.1", "a.2", ..."""
+    names = [n if n else f"Unnamed: {i}" for i, n in enumerate(names)]
+    counts = {}
+    for i, name in enumerate(names):
+        count = counts.get(name, 0)
+        while count > 0:
+            counts[name] = count + 1
+            name = f"{name}.{count}"
+            count = counts.get(name, 0)
+        names[i] = name
+        counts[name] = count + 1
+    return names
+
+
+_CSV_COLUMN_ERROR = re.compile(r"CSV column #(\d+)")
+
+
+def _csv_column_types(data, read, parse, full: bool) -> dict:
+    """column_types that make Arrow's CSV reader match a whole-file read_csv.
+
+    Dates and times stay text, as read_csv leaves them. With `full`, all of
+    `data` is read as well: types are inferred from the first block only, so
+    a later value that doesn't fit fails the read part-way. If one does, the
+    file is read once more with every inferred column as text, to find the
+    narrowest type each one fits throughout. Int columns holding a null
+    anywhere become float64, like read_csv.
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+
+    types = {}
+    while True:
+        reader = pa_csv.open_csv(
+            pa.BufferReader(pa.py_buffer(data)),
+            read_options=read,
+            parse_options=parse,
+            convert_options=_csv_convert_options(types),
+        )
+        temporal = [f.name for f in reader.schema if pa.types.is_temporal(f.type)]
+        if not temporal:
+            break
+        types.update(dict.fromkeys(temporal, pa.string()))
+    if not full:
+        return types
+    with_nulls = set()
+    try:
+        for batch in reader:
+            for field, col in zip(batch.schema, batch.columns):
+                if col.null_count and pa.types.is_integer(field.type):
+                    with_nulls.add(field.name)
+    except pa.ArrowInvalid as e:
+        if _CSV_COLUMN_ERROR.search(str(e)) is None:
+            raise
+        return _widened_column_types(data, read, parse, types, reader.schema)
+    types.update(dict.fromkeys(with_nulls, pa.float64()))
+    return types
+
+
+def _widened_column_types(data, read, parse, types: dict, schema) -> dict:
+    """_csv_column_types after a failed read: every column Arrow inferred a
+    non-text type for is read as text and tried against its ladder (all-null
+    columns: float64, bool; ints: float64), keeping the types that every
+    block fits. Values are checked the way the CSV reader converts them."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+
+    ladders = {}
+    for field in schema:
+        if pa.types.is_null(field.type):
+            ladders[field.name] = [pa.null(), pa.float64(), pa.bool_()]
+        elif pa.types.is_integer(field.type):
+            ladders[field.name] = [field.type, pa.float64()]
+        elif pa.types.is_floating(field.type) or pa.types.is_boolean(field.type):
+            ladders[field.name] = [field.type]
+    reader = pa_csv.open_csv(
+        pa.BufferReader(pa.py_buffer(data)),
+        read_options=read,
+        parse_options=parse,
+        convert_options=_csv_convert_options(
+            {**types, **dict.fromkeys(ladders, pa.string())}
+        ),
+    )
+    bools = pa.array(_CSV_TRUE + _CSV_FALSE)
+    with_nulls = set()
+
+    def fits(col, to) -> bool:
+        if pa.types.is_null(to):
+            return col.null_count == len(col)
+        if pa.types.is_boolean(to):
+            return pc.all(pc.is_in(col.drop_null(), value_set=bools)).as_py() is not False
+        try:
+            # the reader skips spaces and tabs around numbers
+            pc.cast(pc.utf8_trim(col, characters=" \t"), to)
+        except pa.ArrowInvalid:
+            return False
+        return True
+
+    for batch in reader:
+        for name, ladder in ladders.items():
+            col = batch.column(name)
+            ladder[:] = [to for to in ladder if fits(col, to)]
+            if col.null_count:
+                with_nulls.add(name)
+    for name, ladder in ladders.items():
+        to = ladder[0] if ladder else pa.string()
+        if pa.types.is_integer(to) and name in with_nulls:
+            to = pa.float64()
+        types[name] = to
+    return types
 
-    elif to_format.upper() == "XLSX":
-        df.to_excel(output, index=False)
-        ext_out = "xlsx"
 
-    elif to_format.upper() == "JSON":
-        json_str = df.to_json(orient="records")
-        parsed = json.loads(json_str)
-        pretty_json = json.dumps(parsed, indent=4, ensure_ascii=False)
-        output.write(pretty_json.encode("utf-8"))
-        ext_out = "json"
+def _as_frames(chunks) -> Iterator[pd.DataFrame]:
+    for chunk in chunks:
+        yield chunk if isinstance(chunk, pd.DataFrame) else chunk.to_pandas()
 
-    elif to_format.upper() == "TXT":
-        df.to_csv(output, sep="\t", index=False)
-        ext_out = "txt"
 
-    output.seek(0)
-    return f"{name.rsplit('.', 1)[0]}.{ext_out}", output.read()
+# object columns Arrow types by their values; anything else becomes text
+_ARROW_OBJECT_KINDS = frozenset(
+    ("string", "bytes", "boolean", "date", "datetime", "time", "timedelta", "decimal", "period")
+)
+
+
+def _frame_to_batch(df: pd.DataFrame):
+    """RecordBatch of `df` whose types don't depend on which rows it holds.
+
+    Arrow types an object column by its values, so the same column could
+    come out int64 in one chunk and string in the next. Object columns
+    holding numbers or a mix are stored as text, all-NaN ones as empty
+    text; bools (with NaN), dates and nested lists/dicts are left to Arrow.
+    """
+    import pyarrow as pa
+
+    as_text, empty = [], []
+    for i in np.flatnonzero((df.dtypes == object).to_numpy()):
+        col = df.iloc[:, i]
+        kind = pd.api.types.infer_dtype(col, skipna=True)
+        if kind == "empty":
+            empty.append(i)
+        elif kind not in _ARROW_OBJECT_KINDS and not (
+            kind == "mixed" and col.map(lambda v: isinstance(v, (list, dict))).any()
+        ):
+            as_text.append(i)
+    if as_text:
+        df = df.copy()
+        for i in as_text:
+            col = df.iloc[:, i]
+            df.isetitem(i, col.where(col.isna(), col.astype(str)))
+    try:
+        batch = pa.RecordBatch.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # e.g. text mixed with dates: store as text
+        df = df.copy()
+        for i in np.flatnonzero((df.dtypes == object).to_numpy()):
+            col = df.iloc[:, i]
+            df.isetitem(i, col.where(col.isna(), col.astype(str)))
+        batch = pa.RecordBatch.from_pandas(df, preserve_index=False)
+    if empty:
+        batch = batch.cast(_null_as_string(batch.schema))
+    return batch
+
+
+def _null_as_string(schema):
+    """`schema` with null-typed (all-NaN so far) fields widened to string."""
+    import pyarrow as pa
+
+    for i, field in enumerate(schema):
+        if pa.types.is_null(field.type):
+            schema = schema.set(i, field.with_type(pa.string()))
+    return schema
+
+
+def _as_batches(chunks):
+    """RecordBatches cast to the first chunk's schema (Parquet/IPC need one).
+
+    A column that was all NaN in the first chunk is typed string, which
+    any later values can be cast to.
+    """
+    import pyarrow as pa
+
+    schema = None
+    for chunk in chunks:
+        if isinstance(chunk, pd.DataFrame):
+            chunk = _frame_to_batch(chunk)
+        if schema is None:
+            schema = _null_as_string(chunk.schema)
+        if chunk.schema != schema:
+            try:
+                chunk = chunk.cast(schema)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+                raise ValueError(
+                    f"Column types changed part-way through the file: {e}"
+                ) from e
+        yield chunk
+
+
+# ---------------- JSON records ----------------
+# Values come out as json.loads(df.to_json(orient="records")) would give them:
+# NaN/None/NaT/inf -> None, datetimes and timedeltas -> epoch/duration ms
+# (truncated), floats rounded like pandas' encoder (double_precision=10).
+_EXP_MAX = 1e16 - 1
+_EXP_MIN = 1e-15
+_NS_PER_MS = 10**6
+
+
+def _json_float(v: float):
+    if not math.isfinite(v):
+        return None
+    a = abs(v)
+    if a > _EXP_MAX or (a != 0.0 and a < _EXP_MIN):
+        return float("%.9e" % v)  # 10 significant digits
+    # fixed point: 10 decimals, round half to even on the scaled fraction
+    whole = int(a)
+    scaled = (a - whole) * 1e10
+    frac = int(scaled)
+    diff = scaled - frac
+    if diff > 0.5 or (diff == 0.5 and (frac == 0 or frac & 1)):
+        frac += 1
+        if frac >= 10**10:
+            whole, frac = whole + 1, 0
+    return float(f"{'-' if v < 0 else ''}{whole}.{frac:010d}")
+
+
+def _ms(ns: int) -> int:
+    """Nanoseconds -> milliseconds, truncated toward zero like pandas."""
+    return -(-ns // _NS_PER_MS) if ns < 0 else ns // _NS_PER_MS
+
+
+def _json_scalar(v):
+    if v is None or v is pd.NaT or v is pd.NA:
+        return None
+    if isinstance(v, (str, bool)):
+        return v
+    if isinstance(v, (int, np.integer)) and not isinstance(v, np.bool_):
+        return int(v)
+    if isinstance(v, (float, np.floating, decimal.Decimal)):
+        return _json_float(float(v))
+    if isinstance(v, np.bool_):
+        return bool(v)
+    if isinstance(v, (datetime.date, np.datetime64)):  # incl. datetime, Timestamp
+        return _ms(pd.Timestamp(v).value)  # .value is UTC ns even when tz-aware
+    if isinstance(v, (pd.Timedelta, datetime.timedelta, np.timedelta64)):
+        return _ms(pd.Timedelta(v).value)
+    # anything else (lists, dicts, ...): let pandas decide, exactly
+    return json.loads(pd.Series([v], dtype=object).to_json(orient="values"))[0]
+
+
+def _json_column(col: pd.Series) -> list:
+    kind = col.dtype.kind
+    if kind in "Mm":
+        mask = col.isna().tolist()
+        if kind == "M" and getattr(col.dtype, "tz", None) is not None:
+            col = col.dt.tz_convert("UTC").dt.tz_localize(None)
+        ns = col.to_numpy().view("int64")
+        ms = np.where(ns < 0, -(-ns // _NS_PER_MS), ns // _NS_PER_MS)
+        return [None if m else v for m, v in zip(mask, ms.tolist())]
+    if kind == "f" and isinstance(col.dtype, np.dtype):
+        return [_json_float(v) for v in col.tolist()]
+    if kind in "iub" and isinstance(col.dtype, np.dtype):
+        return col.tolist()
+    return [_json_scalar(v) for v in col.astype(object).tolist()]
+
+
+def _json_columns(df: pd.DataFrame):
+    """(keys, value lists, nested) for `df`; nested if any value is a list/dict."""
+    if not df.columns.is_unique:  # a record would keep only the last of them
+        raise ValueError("DataFrame columns must be unique for orient='records'.")
+    keys = [str(c) for c in df.columns]
+    columns, nested = [], False
+    for i in range(df.shape[1]):
+        col = df.iloc[:, i]
+        values = _json_column(col)
+        if col.dtype == object and not nested:
+            nested = any(isinstance(v, (list, dict)) for v in values)
+        columns.append(values)
+    return keys, columns, nested
+
+
+def iter_records(df: pd.DataFrame) -> Iterator[dict]:
+    """Rows of `df` as plain-Python dicts with to_json(orient="records") values."""
+    keys, columns, _ = _json_columns(df)
+    for row in zip(*columns):
+        yield dict(zip(keys, row))
+
+
+# ---------------- writers ----------------
+def _write_delimited(frames, out: BinaryIO, sep: str) -> None:
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="")
+    for i, df in enumerate(frames):
+        df.to_csv(text, sep=sep, index=False, header=i == 0)
+    text.flush()
+    text.detach()
+
+
+# C-accelerated encoders (json only uses the C encoder when indent is None).
+# For flat records the pretty separators reproduce indent=4 nested one level
+# inside the array; records holding lists/dicts fall back to real indenting.
+_COMPACT = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+_PRETTY_FLAT = json.JSONEncoder(ensure_ascii=False, separators=(",\n        ", ": "))
+_PRETTY = json.JSONEncoder(ensure_ascii=False, indent=4)
+
+
+def _pretty_record(record: dict, nested: bool) -> str:
+    if nested:
+        return _PRETTY.encode(record).replace("\n", "\n    ")
+    if not record:
+        return "{}"
+    return "{\n        " + _PRETTY_FLAT.encode(record)[1:-1] + "\n    }"
+
+
+def _write_jsonl(frames, out: BinaryIO) -> None:
+    for df in frames:
+        keys, columns, _ = _json_columns(df)
+        for row in zip(*columns):
+            out.write(_COMPACT.encode(dict(zip(keys, row))).encode("utf-8") + b"\n")
+
+
+def _write_json(frames, out: BinaryIO, pretty: bool = True) -> None:
+    """A JSON array of records, streamed one record at a time.
+
+    pretty=True writes the same bytes as json.dumps(records, indent=4);
+    pretty=False a single-line array with no extra whitespace.
+    """
+    sep = b",\n    " if pretty else b","
+    first = True
+    for df in frames:
+        keys, columns, nested = _json_columns(df)
+        for row in zip(*columns):
+            record = dict(zip(keys, row))
+            if pretty:
+                body = _pretty_record(record, nested)
+            else:
+                body = _COMPACT.encode(record)
+            out.write((b"[\n    " if pretty else b"[") if first else sep)
+            out.write(body.encode("utf-8"))
+            first = False
+    if first:
+        out.write(b"[]")
+    else:
+        out.write(b"\n]" if pretty else b"]")
+
+
+def _write_xlsx(frames, out: BinaryIO) -> None:
+    """openpyxl write-only workbook; header styled like DataFrame.to_excel."""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Border, Font, Side
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    thin = Side(style="thin")
+    rows = 0
+    for i, df in enumerate(frames):
+        if i == 0:
+            header = []
+            for col in df.columns:
+                label = col if isinstance(col, (str, int, float)) else str(col)
+                cell = WriteOnlyCell(ws, value=label)
+                cell.font = Font(bold=True)
+                cell.border = Border(left=thin, right=thin, top=thin, bottom=thin)
+                cell.alignment = Alignment(horizontal="center", vertical="top")
+                header.append(cell)
+            ws.append(header)
+        rows += len(df)
+        if rows + 1 > _XLSX_MAX_ROWS:
+            raise ValueError(
+                f"Too many rows for XLSX ({rows}+); Excel's limit is {_XLSX_MAX_ROWS}."
+            )
+        values = df.astype(object).where(df.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            ws.append(row)
+    wb.save(out)
+
+
+def _write_parquet(batches, out: BinaryIO) -> None:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    for batch in batches:
+        if writer is None:
+            writer = pq.ParquetWriter(out, batch.schema)
+        writer.write_batch(batch)
+    if writer is None:  # no chunks at all: an empty, schemaless file
+        pq.write_table(pa.table({}), out)
+    else:
+        writer.close()
+
+
+def _write_feather(batches, out: BinaryIO) -> None:
+    """Feather v2 (the Arrow IPC file format), lz4-compressed like to_feather."""
+    import pyarrow as pa
+
+    options = pa.ipc.IpcWriteOptions(compression="lz4")
+    writer = None
+    for batch in batches:
+        if writer is None:
+            writer = pa.ipc.new_file(out, batch.schema, options=options)
+        writer.write_batch(batch)
+    if writer is None:
+        writer = pa.ipc.new_file(out, pa.schema([]), options=options)
+    writer.close()
+
+
+def _check_options(to_format: str, engine: str) -> Tuple[str, str]:
+    fmt = to_format.upper()
+    if fmt not in _WRITABLE:
+        raise ValueError(f"Unsupported format: {to_format}")
+    engine = engine.lower()
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine: {engine} (expected one of {ENGINES})")
+    return fmt, engine
+
+
+def _write_chunks(fmt: str, chunks, out: BinaryIO, pretty: bool) -> None:
+    if fmt in ("PARQUET", "FEATHER"):
+        write = _write_parquet if fmt == "PARQUET" else _write_feather
+        write(_as_batches(chunks), out)
+        return
+
+    frames = _as_frames(chunks)
+    if fmt == "CSV":
+        _write_delimited(frames, out, ",")
+    elif fmt == "TXT":
+        _write_delimited(frames, out, "\t")
+    elif fmt == "JSONL":
+        _write_jsonl(frames, out)
+    elif fmt == "JSON":
+        _write_json(frames, out, pretty)
+    elif fmt == "XLSX":
+        _write_xlsx(frames, out)
+
+
+def _to_bytes(fmt: str, chunks, stem: str, pretty: bool) -> Tuple[str, bytes]:
+    with tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX_BYTES) as output:
+        _write_chunks(fmt, chunks, output, pretty)
+        output.seek(0)
+        return f"{stem}.{fmt.lower()}", output.read()
+
+
+def convert_stream(
+    to_format: str,
+    file,
+    out: BinaryIO,
+    chunksize: int = CHUNK_ROWS,
+    pretty: bool = True,  # JSON only: indent=4, else compact
+    engine: str = "pandas",
+    sheet: Optional[Union[str, int]] = None,  # XLSX only, see _pick_sheet
+) -> str:
+    """Convert `file` chunk by chunk into the binary stream `out`; returns the ext.
+
+    Input is read a chunk at a time and each chunk is written out before the
+    next is read, so memory stays bounded by the chunk size when `out` is a
+    file. The bytes-returning wrappers below hold the whole output instead.
+    """
+    fmt, engine = _check_options(to_format, engine)
+    name = getattr(file, "name", "converted")
+    ext = name.split(".")[-1].lower()
+    src = open_input(file, name)  # no copy of the upload
+    reader = iter_batches if engine == "pyarrow" else iter_frames
+    _write_chunks(fmt, reader(src, ext, chunksize, sheet), out, pretty)
+    return fmt.lower()
+
+
+@cached("data", normalize=_normalize_params)
+def data_format_converter(
+    to_format: str = "CSV",
+    file=None,
+    chunksize: int = CHUNK_ROWS,
+    pretty: bool = True,  # JSON only: indent=4, else compact
+    engine: str = "pandas",
+    sheet: Optional[Union[str, int]] = None,  # XLSX only, see _pick_sheet
+) -> Tuple[str, bytes]:
+    """(output name, output bytes) for the UI and the result cache.
+
+    Input is streamed, but the output comes back whole, so memory scales with
+    the output size. convert_stream writes large outputs straight to a file.
+    """
+    name = getattr(file, "name", "converted")
+
+    with tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX_BYTES) as output:
+        ext_out = convert_stream(
+            to_format, file, output, chunksize, pretty, engine, sheet
+        )
+        output.seek(0)
+        return f"{name.rsplit('.', 1)[0]}.{ext_out}", output.read()
+
+
+@cached("data_sheets", normalize=_normalize_params)
+def data_format_converter_sheets(
+    to_format: str = "CSV",
+    file=None,
+    chunksize: int = CHUNK_ROWS,
+    pretty: bool = True,
+    engine: str = "pandas",
+) -> List[Tuple[str, bytes]]:
+    """One output per worksheet of an XLSX (`name-Sheet.ext`); other inputs give one."""
+    fmt, engine = _check_options(to_format, engine)
+    name = getattr(file, "name", "converted")
+    stem, ext = name.rsplit(".", 1)[0], name.split(".")[-1].lower()
+    src = open_input(file, name)
+    if ext != "xlsx":
+        reader = iter_batches if engine == "pyarrow" else iter_frames
+        return [_to_bytes(fmt, reader(src, ext, chunksize), stem, pretty)]
+
+    wb = _open_workbook(src)  # opened once: shared strings are parsed once
+    try:
+        return [
+            _to_bytes(fmt, _iter_sheet(ws, chunksize), f"{stem}-{ws.title}", pretty)
+            for ws in wb.worksheets
+        ]
+    finally:
+        wb.close()
@@ -1,42 +1,39 @@
-from typing import List, Tuple, Union, Dict, Any
+from typing import Iterator, List, Tuple, Union, Dict, Any
 import io
+import os
 import re
+import sys
+import csv
+import tempfile
 import pdfplumber
-import pandas as pd
+from pdfminer.pdftypes import stream_value
+import multiprocessing
 
+from tools.helpers import MAX_WORKERS, SharedBytes, input_bytes, open_input, run_batch
+from tools.result_cache import cached
 
-def _as_bio(
-    file: Union[bytes, bytearray, io.BufferedIOBase, io.BytesIO, Any],
-) -> io.BytesIO:
-    """Normalize input to a fresh BytesIO at position 0 with a best-effort .name."""
-    if isinstance(file, (bytes, bytearray)):
-        bio = io.BytesIO(file)
-        bio.name = getattr(file, "name", "input.pdf")
-        bio.seek(0)
-        return bio
-    if hasattr(file, "read"):
-        name = getattr(file, "name", "input.pdf")
-        try:
-            pos = file.tell()
-        except Exception:
-            pos = None
-        try:
-            file.seek(0)
-            data = file.read()
-        finally:
-            try:
-                if pos is not None:
-                    file.seek(pos)
-            except Exception:
-                pass
-        bio = io.BytesIO(data)
-        bio.name = name
-        bio.seek(0)
-        return bio
-    raise TypeError("Expected bytes or a binary file-like object for PDF input")
+# auto mode only fans out past this many pages; below it, starting workers
+# and re-parsing the PDF in each costs more than it saves
+_PARALLEL_MIN_PAGES = 16
+
+# How far (MB) RSS may grow during one extraction, checked after every page;
+# 0 = no guard. Growth is measured from when extraction starts, so memory the
+# process already held (other sessions, loaded models) doesn't count. With
+# workers > 1 it applies to each worker's share of the pages.
+MAX_RSS_MB = int(os.environ.get("TOOLSTACK_PDF_MAX_RSS_MB", 0))
+
+# per-table CSV sinks stay in memory up to this size, then spill to disk
+_SPOOL_MAX_BYTES = 8 * 1024 * 1024
 
 
-def _looks_like_pdf(bio: io.BytesIO) -> bool:
+def _as_bio(file: Union[bytes, bytearray, io.BufferedIOBase, io.BytesIO, Any]):
+    """Named, seekable view of the input at position 0 (no copy; see open_input)."""
+    bio = open_input(file, "input.pdf")
+    bio.seek(0)
+    return bio
+
+
+def _looks_like_pdf(bio) -> bool:
     cur = bio.tell()
     bio.seek(0)
     head = bio.read(1024)
@@ -64,11 +61,224 @@ def _slug(text: str, maxlen: int = 48) -> str:
     return (text[:maxlen]).strip("_")
 
 
-def extract_pdf_tables(
+def _rss_bytes() -> int:
+    """Resident set size of this process (peak where /proc is missing), 0 if unknown."""
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+# any path-painting operator (stroke/fill) or XObject draw in a content stream
+_PAINT_OPS = re.compile(rb"(?:^|\s)(?:[SsfFBb]\*?|Do)(?=\s|$)")
+
+
+def _may_have_tables(page) -> bool:
+    """Cheap pre-scan: can the default "lines" strategy find a table here?
+
+    Table edges come from ruling lines, rects and curves, which only exist
+    where the content stream strokes or fills a path. Checking the raw
+    operators skips pdfminer's layout pass for text-only pages.
+    """
+    try:
+        data = b"\n".join(stream_value(c).get_data() for c in page.page_obj.contents)
+    except Exception:
+        return True  # unreadable stream: let extract_tables decide
+    return _PAINT_OPS.search(data) is not None
+
+
+def _crop(page, bbox):
+    """page.crop(bbox) clipped to the page; None when they don't overlap."""
+    x0, top, x1, bottom = bbox
+    px0, ptop, px1, pbottom = page.bbox
+    box = (max(x0, px0), max(top, ptop), min(x1, px1), min(bottom, pbottom))
+    if box[0] >= box[2] or box[1] >= box[3]:
+        return None
+    return page.crop(box)
+
+
+def _page_tables(page, page_num: int, max_rss_mb: int, bbox=None, base_rss: int = 0) -> list:
+    tables = []
+    if _may_have_tables(page):
+        region = _crop(page, bbox) if bbox else page
+        if region is not None:
+            tables = region.extract_tables() or []
+    # drop the chars/lines/rects the page cached for layout analysis; without
+    # this every page stays parsed until the PDF is closed
+    page.close()
+    if max_rss_mb and _rss_bytes() - base_rss > max_rss_mb * 1024 * 1024:
+        raise MemoryError(
+            f"PDF extraction grew RSS by more than {max_rss_mb} MB at page {page_num}."
+        )
+    return tables
+
+
+def parse_page_ranges(spec, n_pages: int) -> List[int]:
+    """Page selection -> sorted 1-based page numbers within 1..n_pages.
+
+    `spec` is None/"" (every page), a string like "1-3,5,9-" (open ends
+    allowed) or an iterable of page numbers. Pages past the end of the
+    document are dropped; a selection left with none raises ValueError.
+    """
+    if spec is None or (isinstance(spec, str) and not spec.strip()):
+        return list(range(1, n_pages + 1))
+    if not isinstance(spec, str):
+        return _nonempty(sorted({int(p) for p in spec if 1 <= int(p) <= n_pages}), n_pages)
+
+    pages = set()
+    for part in spec.replace(" ", "").split(","):
+        if not part:
+            continue
+        m = re.fullmatch(r"(\d*)-(\d*)|(\d+)", part)
+        if not m or part == "-":
+            raise ValueError(f"Invalid page range '{part}'. Use e.g. 1-3,5")
+        if m.group(3):
+            first = last = int(m.group(3))
+        else:
+            first = int(m.group(1) or 1)
+            # an open end runs to the last page, even from past it ("100-")
+            last = int(m.group(2)) if m.group(2) else max(first, n_pages)
+        if first < 1 or last < first:
+            raise ValueError(f"Invalid page range '{part}'. Use e.g. 1-3,5")
+        pages.update(range(first, min(last, n_pages) + 1))
+    return _nonempty(sorted(pages), n_pages)
+
+
+def _nonempty(pages: List[int], n_pages: int) -> List[int]:
+    if not pages:
+        raise ValueError(f"No pages selected (document has {n_pages} pages)")
+    return pages
+
+
+def _extract_pages(
+    data, page_nums: List[int], bbox=None, max_rss_mb: int = 0
+) -> List[Tuple[int, list]]:
+    """Pool job: (page_num, tables) for the given 1-based page numbers.
+
+    `data` is the PDF as bytes or a readable file (a SharedFile in workers).
+    """
+    base_rss = _rss_bytes()
+    fp = data if hasattr(data, "read") else io.BytesIO(data)
+    with pdfplumber.open(fp, pages=page_nums) as pdf:
+        return [
+            (page.page_number, _page_tables(page, page.page_number, max_rss_mb, bbox, base_rss))
+            for page in pdf.pages
+        ]
+
+
+def _page_count(bio) -> int:
+    bio.seek(0)
+    with pdfplumber.open(bio) as pdf:
+        return len(pdf.pages)
+
+
+def _iter_page_tables(
+    bio, page_nums: List[int], workers: int, bbox=None, max_rss_mb: int = 0
+):
+    """Yield (page_num, tables) in page order, serially or from the process pool."""
+    if workers == 1:
+        base_rss = _rss_bytes()
+        bio.seek(0)
+        with pdfplumber.open(bio, pages=page_nums) as pdf:
+            for page in pdf.pages:
+                yield page.page_number, _page_tables(
+                    page, page.page_number, max_rss_mb, bbox, base_rss
+                )
+        return
+
+    n_pages = len(page_nums)
+    # a few contiguous ranges per worker keeps the pool busy when pages differ
+    n_chunks = min(n_pages, workers * 4)
+    bounds = [round(i * n_pages / n_chunks) for i in range(n_chunks + 1)]
+    # workers read the PDF straight out of shared memory; no per-worker copy
+    shared = SharedBytes(input_bytes(bio), as_file=True)
+    try:
+        jobs = [
+            (shared, page_nums[a:b], bbox, max_rss_mb)
+            for a, b in zip(bounds, bounds[1:])
+            if b > a
+        ]
+        results = run_batch(_extract_pages, jobs, kind="process")
+    finally:
+        shared.release()
+    for pages, err in results:
+        if err is not None:
+            raise err
+        yield from pages
+
+
+def _resolve_workers(workers: int, n_pages: int) -> int:
+    if workers == 1 or multiprocessing.parent_process() is not None:
+        return 1  # explicit serial, or already inside a pool worker
+    if workers > 1:
+        return workers
+    if MAX_WORKERS < 2 or n_pages < _PARALLEL_MIN_PAGES:
+        return 1
+    return MAX_WORKERS
+
+
+def _drop_runtime_opts(params: dict) -> dict:
+    # parallelism and the memory guard don't change the output
+    params.pop("workers", None)
+    params.pop("max_rss_mb", None)
+    return params
+
+
+class _CsvSink:
+    """CSV rows appended as pages are processed, spooled to disk when large."""
+
+    def __init__(self, cols: List[str]):
+        self._file = tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX_BYTES)
+        self._text = io.TextIOWrapper(self._file, encoding="utf-8", newline="")
+        # same dialect as DataFrame.to_csv
+        self._writer = csv.writer(self._text, lineterminator=os.linesep)
+        self._width = len(cols)
+        self._writer.writerow(cols)
+
+    def write(self, row: list) -> None:
+        # as DataFrame(rows, columns=cols) did: never more cells than headers
+        if len(row) > self._width:
+            raise ValueError(
+                f"{self._width} columns passed, passed data had {len(row)} columns"
+            )
+        if len(row) < self._width:
+            row = row + [None] * (self._width - len(row))
+        self._writer.writerow(row)
+
+    def finish(self) -> bytes:
+        self._text.flush()
+        self._text.detach()
+        self._file.seek(0)
+        data = self._file.read()
+        self._file.close()
+        return data
+
+    def discard(self) -> None:
+        if not self._file.closed:
+            self._text.close()
+
+
+def iter_pdf_tables(
     file: Union[bytes, io.BytesIO, io.BufferedIOBase],
     include_page_col: bool = True,
-) -> List[Tuple[str, bytes]]:
+    workers: int = 0,  # 0 = auto (parallel for long PDFs), 1 = serial
+    max_rss_mb: int | None = None,  # None = MAX_RSS_MB; raises MemoryError past it
+    pages: Union[str, List[int], None] = None,  # "1-3,5"; None = every page
+    bbox: Tuple[float, float, float, float] | None = None,  # (x0, top, x1, bottom) pt
+) -> Iterator[Tuple[str, bytes]]:
+    """Yield (csv_name, csv_bytes) per header signature, one table group at a time.
 
+    Rows are streamed into per-signature CSV sinks while pages are read; a
+    group is final only once the last page is done, so outputs come after
+    the page walk, each materialized just as it is yielded.
+    """
     bio = _as_bio(file)
     if not _looks_like_pdf(bio):
         raise ValueError(
@@ -77,12 +287,17 @@ def extract_pdf_tables(
 
     stem = getattr(bio, "name", "tables").rsplit(".", 1)[0]
 
-    groups: Dict[Tuple[str, ...], Dict[str, Any]] = {}
+    # signature -> (first headers seen, sink)
+    groups: Dict[Tuple[str, ...], Tuple[list, _CsvSink]] = {}
 
-    bio.seek(0)
-    with pdfplumber.open(bio) as pdf:
-        for page_num, page in enumerate(pdf.pages, start=1):
-            tables = page.extract_tables() or []
+    if max_rss_mb is None:
+        max_rss_mb = MAX_RSS_MB
+    page_nums = parse_page_ranges(pages, _page_count(bio))
+    page_tables = _iter_page_tables(
+        bio, page_nums, _resolve_workers(workers, len(page_nums)), bbox, max_rss_mb
+    )
+    try:
+        for page_num, tables in page_tables:
             for table in tables:
                 if not table or len(table) == 0:
                     continue
@@ -90,46 +305,45 @@ def extract_pdf_tables(
                 headers = list(table[0])  # first row as header
                 body = table[1:]
 
-                # drop repeated head rows
-                body = [row for row in body if row != headers]
-
                 sig = _signature(headers)
 
                 if sig not in groups:
-                    groups[sig] = {"headers": headers, "rows": []}
+                    cols = [str(h) if h is not None else "" for h in headers]
+                    if include_page_col:
+                        cols = ["page"] + cols
+                    groups[sig] = (headers, _CsvSink(cols))
+                sink = groups[sig][1]
 
-                # Append rows; keep page info
-                if include_page_col:
-                    for r in body:
-                        groups[sig]["rows"].append([page_num] + list(r))
-                else:
-                    for r in body:
-                        groups[sig]["rows"].append(list(r))
+                # drop repeated head rows; keep page info
+                for r in body:
+                    if r == headers:
+                        continue
+                    sink.write([page_num] + list(r) if include_page_col else list(r))
 
+        if not groups:
+            raise ValueError("No tables found in the PDF.")
 
-    if not groups:
-        raise ValueError("No tables found in the PDF.")
+        for idx, (headers, sink) in enumerate(list(groups.values()), start=1):
+            # using the first few header names as file name
+            header_slug = _slug(
+                "_".join([str(h or "") for h in headers]) or f"group_{idx}"
+            )
+            yield f"{stem}_{header_slug}.csv", sink.finish()
+    finally:
+        # errors or an abandoned generator: drop whatever is still spooled
+        for _, sink in groups.values():
+            sink.discard()
 
-    outputs: List[Tuple[str, bytes]] = []
-    for idx, (sig, bundle) in enumerate(groups.items(), start=1):
-        headers = bundle["headers"]
-        rows = bundle["rows"]
-
-        if include_page_col:
-            cols = ["page"] + [str(h) if h is not None else "" for h in headers]
-        else:
-            cols = [str(h) if h is not None else "" for h in headers]
 
-        # write CSV
-        df = pd.DataFrame(rows, columns=cols)
-
-        out = io.BytesIO()
-        df.to_csv(out, index=False)
-        out.seek(0)
-
-        # using the first few header names as file name
-        header_slug = _slug("_".join([str(h or "") for h in headers]) or f"group_{idx}")
-        fname = f"{stem}_{header_slug}.csv"
-        outputs.append((fname, out.read()))
-
-    return outputs
+@cached("pdf", normalize=_drop_runtime_opts)
+def extract_pdf_tables(
+    file: Union[bytes, io.BytesIO, io.BufferedIOBase],
+    include_page_col: bool = True,
+    workers: int = 0,  # 0 = auto (parallel for long PDFs), 1 = serial
+    max_rss_mb: int | None = None,  # None = MAX_RSS_MB; raises MemoryError past it
+    pages: Union[str, List[int], None] = None,  # "1-3,5"; None = every page
+    bbox: Tuple[float, float, float, float] | None = None,  # (x0, top, x1, bottom) pt
+) -> List[Tuple[str, bytes]]:
+    return list(
+        iter_pdf_tables(file, include_page_col, workers, max_rss_mb, pages, bbox)
+    )
@@ -1,9 +1,186 @@
 # helpers.py
-import os, subprocess, tempfile, shutil
-from concurrent.futures import ThreadPoolExecutor
+import os, sys, subprocess, shutil, json, struct, select, queue, threading, time, atexit
+import io, mmap, tempfile
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from io import BytesIO
 
-_executor = ThreadPoolExecutor(max_workers=1)
+from tools.result_cache import cached, is_miss
+
+# ---------------- job scheduler ----------------
+# Pool size defaults to the host's cores; TOOLSTACK_WORKERS overrides it and
+# TOOLSTACK_POOL picks the default backend ("thread" | "process").
+MAX_WORKERS = int(os.environ.get("TOOLSTACK_WORKERS", 0)) or (os.cpu_count() or 1)
+DEFAULT_POOL = os.environ.get("TOOLSTACK_POOL", "thread")
+
+# Per-tool default; TOOLSTACK_POOL_<TOOL> overrides. Pillow encoding and pandas
+# parsing hold the GIL, so only processes scale them. rembg/onnxruntime and the
+# Node tracer already run outside the GIL.
+_TOOL_POOLS = {"image": "process", "data": "process"}
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+_process_executor = None
+_process_lock = threading.Lock()
+
+
+def get_executor(kind: str = "thread"):
+    """Shared executor for `kind` ("thread" | "process"); process pool is lazy."""
+    global _process_executor
+    if kind == "thread":
+        return _executor
+    if kind != "process":
+        raise ValueError(f"Unknown pool kind: {kind}")
+    with _process_lock:
+        if _process_executor is None:
+            # spawn: forking a process that already runs onnxruntime/Node
+            # bridge threads is not safe
+            _process_executor = ProcessPoolExecutor(
+                max_workers=MAX_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            atexit.register(_process_executor.shutdown, wait=False)
+        return _process_executor
+
+
+def _reset_process_pool():
+    """Drop a broken process pool so the next batch starts a fresh one."""
+    global _process_executor
+    with _process_lock:
+        if _process_executor is not None:
+            _process_executor.shutdown(wait=False, cancel_futures=True)
+            _process_executor = None
+
+
+def pool_for(tool: str) -> str:
+    """Pool kind ("thread" | "process") a tool section should run its batch on."""
+    env = os.environ.get(f"TOOLSTACK_POOL_{tool.upper()}")
+    return env or _TOOL_POOLS.get(tool, DEFAULT_POOL)
+
+
+# ---------------- process-pool transport ----------------
+# Inputs this big are parked in shared memory instead of being pickled
+# through the pool's pipe.
+_SHM_MIN_BYTES = 64 * 1024
+
+
+class SharedBytes:
+    """Picklable handle to a bytes payload parked in shared memory.
+
+    The parent creates (and later releases) the segment; a worker calls
+    load() to get the bytes back, or a named BytesIO if ``name`` was given.
+    With ``as_file=True`` load() returns a SharedFile reading the segment in
+    place instead, so a large input isn't copied into every worker.
+    """
+
+    def __init__(self, data, name: str | None = None, as_file: bool = False):
+        view = memoryview(data).cast("B")
+        self.size = view.nbytes
+        self.name = name
+        self.as_file = as_file
+        self._shm = shared_memory.SharedMemory(create=True, size=max(1, self.size))
+        self._shm.buf[: self.size] = view
+        self.shm_name = self._shm.name
+
+    def __getstate__(self):
+        return {
+            "size": self.size,
+            "name": self.name,
+            "as_file": self.as_file,
+            "shm_name": self.shm_name,
+        }
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._shm = None
+
+    def load(self):
+        shm = shared_memory.SharedMemory(name=self.shm_name)
+        if self.as_file:
+            return SharedFile(shm, self.size, self.name or "input")
+        try:
+            data = bytes(shm.buf[: self.size])
+        finally:
+            shm.close()
+        return data if self.name is None else bytesio_with_name(data, self.name)
+
+    def release(self):
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+
+class SharedFile(io.RawIOBase):
+    """Read-only, seekable file over an attached shared-memory segment.
+
+    Reads copy only the bytes asked for. close() detaches the segment; the
+    worker entry point closes it once the job returns.
+    """
+
+    def __init__(self, shm, size: int, name: str = "input"):
+        super().__init__()
+        self._shm = shm
+        self._view = shm.buf[:size]
+        self._pos = 0
+        self.name = name
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size is None or size < 0 else self._pos + size
+        data = bytes(self._view[self._pos:end])
+        self._pos += len(data)
+        return data
+
+    def readall(self) -> bytes:
+        return self.read()
+
+    def readinto(self, b) -> int:
+        data = self.read(len(b))
+        b[: len(data)] = data
+        return len(data)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        base = (0, self._pos, len(self._view))[whence]
+        if base + offset < 0:
+            raise ValueError("negative seek position")
+        self._pos = base + offset
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self):
+        if not self.closed:
+            self._view.release()
+            self._shm.close()
+        super().close()
+
+
+def _share_arg(arg):
+    if isinstance(arg, (bytes, bytearray, memoryview)) and len(arg) >= _SHM_MIN_BYTES:
+        return SharedBytes(arg)
+    if isinstance(arg, BytesIO) and hasattr(arg, "name"):
+        # getvalue() hands back an upload's own bytes; getbuffer() would copy
+        return SharedBytes(arg.getvalue(), name=arg.name)
+    return arg
+
+
+def _call_with_shared(fn, args, kwargs):
+    """Pool-worker entry point: resolve SharedBytes handles, then call fn."""
+    args = [a.load() if isinstance(a, SharedBytes) else a for a in args]
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        for a in args:
+            if isinstance(a, SharedFile):
+                a.close()
 
 
 def run_in_thread(fn, *args, **kwargs):
@@ -11,6 +188,201 @@ def run_in_thread(fn, *args, **kwargs):
     return _executor.submit(fn, *args, **kwargs)
 
 
+def run_batch(fn, jobs, *, kwargs=None, kind=None, on_progress=None) -> list:
+    """Run ``fn(*args, **kwargs)`` for every ``args`` tuple in ``jobs`` at once.
+
+    Returns ``[(result, error), ...]`` in the same order as ``jobs``. Exactly one
+    of the pair is None. ``on_progress(done, total)`` is called from the calling
+    thread as jobs finish, so it can safely update Streamlit widgets.
+    """
+    kwargs = kwargs or {}
+    kind = kind or DEFAULT_POOL
+    executor = get_executor(kind)
+
+    # @cached tools skip their cache inside pool workers, so look results up
+    # (and store them) here in the parent
+    cache = getattr(fn, "cache", None) if kind == "process" else None
+    keys, hits, failed = {}, {}, {}
+    for i, args in enumerate(jobs if cache else ()):
+        try:  # binding/normalizing bad arguments fails this job only
+            keys[i] = fn.cache_key(*args, **kwargs)
+        except Exception as e:
+            failed[i] = e
+            continue
+        value = cache.get(keys[i])
+        if not is_miss(value):
+            hits[i] = value
+
+    shared = []
+    futures = {}
+    for i, args in enumerate(jobs):
+        if i in hits or i in failed:
+            continue
+        if kind == "process":
+            # bytes go through shared memory; only the small handles get pickled
+            args = [_share_arg(a) for a in args]
+            shared += [a for a in args if isinstance(a, SharedBytes)]
+            futures[i] = executor.submit(_call_with_shared, fn, args, kwargs)
+        else:
+            futures[i] = executor.submit(fn, *args, **kwargs)
+
+    try:
+        total = len(jobs)
+        settled = len(hits) + len(failed)
+        if on_progress:
+            on_progress(settled, total)
+        for done, _ in enumerate(as_completed(futures.values()), start=settled + 1):
+            if on_progress:
+                on_progress(done, total)
+    finally:
+        for handle in shared:
+            handle.release()
+
+    results = []
+    for i in range(len(jobs)):
+        if i in hits:
+            results.append((hits[i], None))
+            continue
+        if i in failed:
+            results.append((None, failed[i]))
+            continue
+        fut = futures[i]
+        err = fut.exception()
+        results.append((None, err) if err is not None else (fut.result(), None))
+        if err is None and cache:
+            cache.put(keys[i], results[-1][0])
+        if isinstance(err, BrokenProcessPool):
+            _reset_process_pool()
+    return results
+
+
+# ---------------- inputs ----------------
+# Real files at least this big are memory-mapped; smaller inputs and
+# non-seekable streams under it are just read into memory.
+_MMAP_MIN_BYTES = 1024 * 1024
+
+
+class MappedFile(mmap.mmap):
+    """Read-only mmap of a file that also carries a ``.name``."""
+
+    name = "input"
+
+    def seekable(self) -> bool:  # zipfile (XLSX) probes this
+        return True
+
+    def readable(self) -> bool:
+        return True
+
+
+def _map_file(fh, name: str):
+    try:
+        mapped = MappedFile(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):  # e.g. empty file
+        return None
+    mapped.name = name
+    return mapped
+
+
+def open_input(file, name: str = "input"):
+    """Seekable, named, read-only view of an input without copying its bytes.
+
+    - bytes: wrapped in a BytesIO, which shares the buffer (bytearray and
+      memoryview are copied once)
+    - BytesIO / Streamlit UploadedFile: a fresh BytesIO over getvalue(),
+      which for an unmodified upload is its own bytes (copy-on-write)
+    - real files: memory-mapped once they pass _MMAP_MIN_BYTES
+    - anything else readable: read, spooling big non-seekable streams to a
+      temp file that is then mapped
+    The caller's object and stream position are left untouched.
+    """
+    own_name = getattr(file, "name", None)
+    name = own_name if isinstance(own_name, str) and own_name else name  # fdopen: int
+    if isinstance(file, (bytes, bytearray, memoryview)):
+        return bytesio_with_name(file if isinstance(file, bytes) else bytes(file), name)
+    if isinstance(file, BytesIO):
+        return bytesio_with_name(file.getvalue(), name)
+    if isinstance(file, MappedFile):
+        file.seek(0)  # already a read-only mapping; nothing to copy
+        return file
+    if not hasattr(file, "read"):
+        raise TypeError("Expected bytes or a binary file-like object")
+
+    try:
+        pos = file.tell()
+        file.seek(0)
+    except (OSError, AttributeError, ValueError):
+        pos = None
+
+    try:
+        if pos is not None and hasattr(file, "fileno"):
+            try:
+                size = os.fstat(file.fileno()).st_size
+            except (OSError, ValueError, AttributeError):
+                size = 0
+            if size >= _MMAP_MIN_BYTES:
+                mapped = _map_file(file, name)
+                if mapped is not None:
+                    return mapped
+
+        # read up to the threshold in memory; past it, spool to disk and map
+        head = file.read(_MMAP_MIN_BYTES)
+        rest = file.read(1)
+        if not rest:
+            return bytesio_with_name(head, name)
+        with tempfile.TemporaryFile() as spool:
+            spool.write(head)
+            spool.write(rest)
+            shutil.copyfileobj(file, spool, _MMAP_MIN_BYTES)
+            spool.flush()
+            return _map_file(spool, name)
+    finally:
+        if pos is not None:
+            file.seek(pos)
+
+
+def input_bytes(f):
+    """Buffer over an open_input() result, for hashing or shared memory."""
+    return f.getvalue() if isinstance(f, BytesIO) else memoryview(f)
+
+
+# ---------------- previews ----------------
+# Sections show results at 300 px; anything bigger is wasted session memory.
+PREVIEW_WIDTH = 300
+# outputs up to this size in a browser-displayable format are their own preview
+_PREVIEW_SKIP_BYTES = 128 * 1024
+_DISPLAYABLE = {"png", "jpeg", "jpg", "webp"}
+
+
+def make_preview(img, out_bytes: bytes = b"", out_format: str = "", width: int = PREVIEW_WIDTH):
+    """Small display copy of an already-decoded result, or None to show the output itself.
+
+    reduce()s to `width` px and encodes WEBP (alpha) or JPEG at low effort.
+    A preview that can't be made is None too; it never fails the job.
+    """
+    from PIL import Image
+
+    if out_format.lower() in _DISPLAYABLE and 0 < len(out_bytes) <= _PREVIEW_SKIP_BYTES:
+        return None
+    try:
+        alpha = img.mode in ("RGBA", "LA", "PA", "RGBa", "La") or "transparency" in img.info
+        if img.mode.startswith("I;16"):
+            # 16-bit grey: reduce() can't take it and convert() would clip at 255
+            img = img.convert("I").point(lambda v: v * (1 / 256)).convert("L")
+        elif img.mode not in ("L", "RGB", "RGBA"):
+            img = img.convert("RGBA" if alpha else "RGB")
+        if img.width > width:
+            size = (width, max(1, round(img.height * width / img.width)))
+            img = img.resize(size, Image.BILINEAR, reducing_gap=1.0)
+        buf = BytesIO()
+        if alpha:
+            img.convert("RGBA").save(buf, format="WEBP", quality=80, method=0)
+        else:
+            img.convert("RGB").save(buf, format="JPEG", quality=80)
+        return buf.getvalue()
+    except Exception:
+        return None
+
+
 # ----------- paths ----------
 def _repo_root_dir() -> str:
     return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -43,6 +415,168 @@ def bytesio_with_name(raw: bytes, name: str) -> BytesIO:
     return bio
 
 
+class _NodeTraceWorker:
+    """One long-lived `node png2svg_tool.mjs --serve` process.
+
+    Speaks the framed protocol from png2svg_tool.mjs: u32be header length,
+    JSON header, then `header["len"]` payload bytes, in both directions.
+    """
+
+    def __init__(self):
+        self.proc = None
+        self.start()
+
+    def start(self):
+        self.proc = subprocess.Popen(
+            [_embedded_node_bin(), path_convert_mjs(), "--serve"],
+            cwd=_repo_root_dir(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            bufsize=0,
+        )
+
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def stop(self):
+        if self.proc is None:
+            return
+        try:
+            self.proc.stdin.close()
+            self.proc.wait(timeout=2)
+        except Exception:
+            self.proc.kill()
+            self.proc.wait()
+        self.proc = None
+
+    def restart(self):
+        self.stop()
+        self.start()
+
+    def _write(self, header: dict, payload=b""):
+        head = json.dumps({**header, "len": len(payload)}).encode("utf-8")
+        self.proc.stdin.write(struct.pack(">I", len(head)) + head)
+        if len(payload):
+            self.proc.stdin.write(payload)
+
+    def _read_exact(self, n: int, deadline: float) -> bytes:
+        fd = self.proc.stdout.fileno()
+        chunks, remaining = [], n
+        while remaining:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0 or not select.select([fd], [], [], timeout)[0]:
+                raise TimeoutError("png2svg worker did not answer in time")
+            chunk = os.read(fd, min(remaining, 1 << 20))
+            if not chunk:
+                raise EOFError("png2svg worker exited")
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks)
+
+    def _read(self, timeout: float):
+        deadline = time.monotonic() + timeout
+        (head_len,) = struct.unpack(">I", self._read_exact(4, deadline))
+        header = json.loads(self._read_exact(head_len, deadline))
+        payload = self._read_exact(header.get("len", 0), deadline)
+        return header, payload
+
+    def request(self, header: dict, payload=b"", timeout: float = 300.0):
+        self._write(header, payload)
+        return self._read(timeout)
+
+    def ping(self, timeout: float = 5.0) -> bool:
+        try:
+            header, _ = self.request({"op": "ping"}, timeout=timeout)
+        except Exception:
+            return False
+        return bool(header.get("ok"))
+
+
+class _NodeTracePool:
+    """Pool of reusable Node trace workers.
+
+    Lives at module level, so it survives Streamlit reruns. Workers are
+    started lazily, health-checked when they have been idle for a while and
+    restarted if they crash mid-request.
+    """
+
+    _IDLE_PING_S = 30.0
+
+    def __init__(self, size: int):
+        self.size = max(1, size)
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._started = 0
+        self._all = []
+
+    def _acquire(self):
+        with self._lock:
+            if self._idle.empty() and self._started < self.size:
+                worker = _NodeTraceWorker()
+                worker.last_used = time.monotonic()
+                self._started += 1
+                self._all.append(worker)
+                return worker
+        worker = self._idle.get()
+        idle_for = time.monotonic() - worker.last_used
+        if not worker.alive() or (idle_for > self._IDLE_PING_S and not worker.ping()):
+            worker.restart()
+        return worker
+
+    def _release(self, worker):
+        worker.last_used = time.monotonic()
+        self._idle.put(worker)
+
+    def trace(self, raw_bytes, flags: dict) -> bytes:
+        worker = self._acquire()
+        try:
+            for attempt in (1, 2):
+                try:
+                    header, payload = worker.request(
+                        {"op": "trace", "flags": flags}, raw_bytes
+                    )
+                    break
+                except (OSError, EOFError, TimeoutError, ValueError) as e:
+                    # crashed / hung / garbled stream: start fresh and retry once
+                    print(f"[png2svg] worker failed ({e!r}), restarting", file=sys.stderr)
+                    worker.restart()
+                    if attempt == 2:
+                        raise RuntimeError("imagetracer failed") from e
+        finally:
+            self._release(worker)
+
+        if not header.get("ok"):
+            print("[png2svg ERROR] FLAGS:", flags, file=sys.stderr)
+            print("[png2svg ERROR]:\n", header.get("error"), file=sys.stderr)
+            raise RuntimeError("imagetracer failed")
+        return payload
+
+    def shutdown(self):
+        with self._lock:
+            for worker in self._all:
+                worker.stop()
+            self._all.clear()
+            self._started = 0
+            self._idle = queue.LifoQueue()
+
+
+_trace_pool = None
+_trace_pool_lock = threading.Lock()
+
+
+def get_trace_pool() -> _NodeTracePool:
+    global _trace_pool
+    with _trace_pool_lock:
+        if _trace_pool is None:
+            size = int(os.environ.get("TOOLSTACK_SVG_WORKERS", 0)) or min(
+                4, os.cpu_count() or 1
+            )
+            _trace_pool = _NodeTracePool(size)
+            atexit.register(_trace_pool.shutdown)
+        return _trace_pool
+
+
+@cached("png2svg")
 def trace_with_imagetracer_node(
     raw_bytes: bytes,
     *,
@@ -65,51 +599,24 @@ def trace_with_imagetracer_node(
             "Node.js not available (embedded and system node not found)."
         )
 
-    with tempfile.TemporaryDirectory() as td:
-        inp = os.path.join(td, "in.png")
-        out = os.path.join(td, "out.svg")
-        with open(inp, "wb") as f:
-            f.write(raw_bytes)
-
-        args = [
-            _embedded_node_bin(),  
-            mjs,
-            inp,
-            out,
-            f"--mode={mode}",
-            f"--layers={int(max(2, layers))}",
-        ]
-        if upscale and int(upscale) > 1:
-            args.append(f"--upscale={int(upscale)}")
-        if preblur and float(preblur) > 0:
-            args.append(f"--preblur={float(preblur)}")
-        if median and int(median) > 0:
-            args.append(f"--median={int(median)}")
-        if mergecolors and int(mergecolors) > 0:
-            args.append(f"--mergecolors={int(mergecolors)}")
-        if dropwhite:
-            args.append("--dropwhite")
-        if svgo:
-            args.append("--svgo")
-        if palette_hex_csv:
-            args.append(f"--palette={palette_hex_csv}")
-
-        res = subprocess.run(
-            args,
-            cwd=_repo_root_dir(),  # run from repo root 
-            capture_output=True,
-            text=True,
-        )
-        if res.returncode != 0:
-            import sys
-
-            print("[png2svg ERROR] CMD:", " ".join(args), file=sys.stderr)
-            print("[png2svg ERROR] STDOUT:\n", res.stdout, file=sys.stderr)
-            print("[png2svg ERROR] STDERR:\n", res.stderr, file=sys.stderr)
-            raise RuntimeError("imagetracer failed")
+    # same names as the mjs CLI flags
+    flags = {"mode": mode, "layers": int(max(2, layers))}
+    if upscale and int(upscale) > 1:
+        flags["upscale"] = int(upscale)
+    if preblur and float(preblur) > 0:
+        flags["preblur"] = float(preblur)
+    if median and int(median) > 0:
+        flags["median"] = int(median)
+    if mergecolors and int(mergecolors) > 0:
+        flags["mergecolors"] = int(mergecolors)
+    if dropwhite:
+        flags["dropwhite"] = True
+    if svgo:
+        flags["svgo"] = True
+    if palette_hex_csv:
+        flags["palette"] = palette_hex_csv
 
-        with open(out, "rb") as f:
-            return f.read()
+    return get_trace_pool().trace(raw_bytes, flags)
 
 
 def embed_svg(svg_bytes: bytes):
@@ -1,13 +1,58 @@
 # image_format_converter_tool.py
 import io
-from typing import Tuple, Tuple as _Tuple
-from PIL import Image, ImageOps
+import threading
+from typing import List, Optional, Sequence, Tuple, Tuple as _Tuple
+from PIL import ExifTags, Image, ImageFile, ImageOps
 import pillow_heif
 
+from tools.helpers import make_preview, open_input
+from tools.result_cache import cached, is_miss
+
 pillow_heif.register_heif_opener()
 
 _WRITABLE = {"PNG", "JPEG", "JPG", "WEBP", "HEIF","ICO"}
 
+# encoder quality when a caller doesn't pick one
+_DEFAULT_QUALITY = {"WEBP": 95, "JPEG": 95, "HEIF": 90}
+
+# Encoder effort presets: speed vs. output size at the same quality.
+# "smallest" is the historical (slowest) setting and stays the default.
+EFFORTS = ("fast", "balanced", "smallest")
+_EFFORT_PARAMS = {
+    "PNG": {
+        "fast": dict(compress_level=1),
+        "balanced": dict(compress_level=6),
+        "smallest": dict(optimize=True),
+    },
+    "WEBP": {
+        "fast": dict(method=0),
+        "balanced": dict(method=4),
+        "smallest": dict(method=6),
+    },
+    "JPEG": {
+        "fast": dict(subsampling="4:4:4"),
+        "balanced": dict(subsampling="4:4:4", optimize=True),
+        "smallest": dict(subsampling="4:4:4", progressive=True, optimize=True),
+    },
+    "HEIF": {  # x265 presets; libheif's default is "slow"
+        "fast": dict(enc_params={"preset": "ultrafast"}),
+        "balanced": dict(enc_params={"preset": "medium"}),
+        "smallest": {},
+    },
+}
+
+# target_bytes search: qualities tried, and how far under the target is
+# close enough to stop early
+_LOSSY = ("JPEG", "WEBP", "HEIF")
+_QUALITY_RANGE = (1, 100)
+_TARGET_TOLERANCE = 0.05
+# encodes at the requested effort per target_bytes search (each is slow for
+# "smallest": several seconds for a large HEIF)
+_MAX_FINAL_ENCODES = 3
+
+# like Image.thumbnail: reduce() by whole factors, then resample the last ~2x
+_REDUCING_GAP = 2.0
+
 
 def _normalize_format(fmt: str) -> str:
     if not fmt:
@@ -53,60 +98,95 @@ def _flatten_on_bg(img: Image.Image, bg: _Tuple[int, int, int]) -> Image.Image:
     return img.convert("RGB")
 
 
-def image_format_converter(
-    to_format: str = "png",
-    raw_bytes: bytes = b"",
-    max_width: int = 0,
-    *,
-    flatten_bg: _Tuple[int, int, int] = (
-        255,
-        255,
-        255,
-    ),  # if needed
-) -> Tuple[str, bytes, Image.Image]:
+# ---------------- decode ----------------
+def _open_src(raw_bytes):
+    # bytes or a file-like (e.g. an UploadedFile), read without copying
+    src = open_input(raw_bytes) if raw_bytes is not None else None
+    if src is None or src.seek(0, io.SEEK_END) == 0:
+        raise ValueError("raw_bytes must be non-empty bytes or a binary file.")
+    src.seek(0)
+    return src
 
-    if not isinstance(raw_bytes, (bytes, bytearray)) or len(raw_bytes) == 0:
-        raise ValueError("raw_bytes must be non-empty bytes.")
 
-    out_format = _normalize_format(to_format)
+def _oriented_size(img: Image.Image) -> _Tuple[int, int]:
+    """Size after EXIF orientation is applied (5-8 swap width and height)."""
+    w, h = img.size
+    if img.getexif().get(ExifTags.Base.Orientation, 1) in (5, 6, 7, 8):
+        return h, w
+    return w, h
+
 
-    # Open and auto-apply EXIF orientation
-    img = Image.open(io.BytesIO(raw_bytes))
-    img = ImageOps.exif_transpose(img)
+def _target_size(size: _Tuple[int, int], max_width: int) -> _Tuple[int, int]:
+    w, h = size
+    if not max_width or w <= max_width:
+        return size
+    return max_width, int(round(h * (max_width / w)))
 
-    # resize (keep aspect ratio)
-    if max_width and img.width > max_width:
-        new_height = int(round(img.height * (max_width / img.width)))
-        img = img.resize((max_width, new_height), Image.BICUBIC)
 
-    # Prepare save parameters per format
-    save_kwargs = {}
-    if out_format == "PNG":
-        save_kwargs.update(dict(format="PNG", optimize=True))
+def _open_oriented(src, max_width: int = 0) -> _Tuple[Image.Image, _Tuple[int, int]]:
+    """Open and EXIF-orient; returns (image, full oriented size).
 
-    elif out_format == "WEBP":
-        save_kwargs.update(dict(format="WEBP", quality=95, method=6))
+    With `max_width`, JPEGs decode at the smallest DCT scale (1/2, 1/4, 1/8)
+    that still leaves _REDUCING_GAP x the target, so the image may come back
+    smaller than the full size. Other formats (HEIF included: libheif has no
+    scaled decode) load at full size and rely on _resize's reduce().
+    """
+    img = Image.open(src)
+    full = _oriented_size(img)
+    tw, th = _target_size(full, max_width)
+    if (tw, th) != full:
+        want = (int(tw * _REDUCING_GAP), int(th * _REDUCING_GAP))
+        if full != img.size:  # draft() works on the stored, unrotated pixels
+            want = want[::-1]
+        img.draft(None, want)  # no-op for non-JPEG sources
+    ImageOps.exif_transpose(img, in_place=True)  # no full-size copy when upright
+    return img, full
+
+
+def _resize(img: Image.Image, size: _Tuple[int, int]) -> Image.Image:
+    if img.size == size:
+        return img
+    # reduce() has no 16-bit integer modes (16-bit PNGs load as I;16)
+    gap = None if img.mode.startswith("I;16") else _REDUCING_GAP
+    return img.resize(size, Image.BICUBIC, reducing_gap=gap)
 
-    elif out_format == "JPEG":
+
+# ---------------- encode ----------------
+def _prepare(img: Image.Image, out_format: str, flatten_bg) -> Image.Image:
+    """Mode fix-ups an encoder needs (JPEG has no alpha)."""
+    if out_format == "JPEG":
         # If image has alpha, flatten onto background; otherwise ensure RGB
         if _has_alpha(img):
-            img = _flatten_on_bg(img, flatten_bg)
-        elif img.mode != "RGB":
-            img = img.convert("RGB")
-        save_kwargs.update(
-            dict(
-                format="JPEG",
-                quality=95,
-                subsampling="4:4:4",
-                progressive=True,
-                optimize=True,
-            )
-        )
+            return _flatten_on_bg(img, flatten_bg)
+        if img.mode != "RGB":
+            return img.convert("RGB")
+    return img
+
 
-    elif out_format == "HEIF":
-        save_kwargs.update(dict(format="HEIF", quality=90))
-    elif out_format =="ICO":
-        save_kwargs.update(dict(format="ICO", sizes=[(16, 16), (32, 32), (48, 48)]))
+def _normalize_effort(effort: str) -> str:
+    e = (effort or "").strip().lower()
+    if e not in EFFORTS:
+        raise ValueError(f"Unknown effort '{effort}'. Supported: {list(EFFORTS)}")
+    return e
+
+
+_MAXBLOCK_LOCK = threading.Lock()
+
+
+def _encode(
+    img: Image.Image,
+    out_format: str,
+    quality: Optional[int] = None,
+    effort: str = "smallest",
+) -> bytes:
+    """Encode `img` (already _prepare()d) with the format's save settings."""
+    q = quality or _DEFAULT_QUALITY.get(out_format)
+    save_kwargs = dict(format=out_format)
+    if out_format in ("WEBP", "JPEG", "HEIF"):
+        save_kwargs["quality"] = q
+    elif out_format == "ICO":
+        save_kwargs["sizes"] = [(16, 16), (32, 32), (48, 48)]
+    save_kwargs.update(_EFFORT_PARAMS.get(out_format, {}).get(effort, {}))
 
     # Try to preserve metadata
     exif = img.info.get("exif")
@@ -118,7 +198,270 @@ def image_format_converter(
 
     # Save to memory
     out_buf = io.BytesIO()
-    img.save(out_buf, **save_kwargs)
-    out_buf.seek(0)
+    try:
+        img.save(out_buf, **save_kwargs)
+    except OSError:
+        if out_format != "JPEG" or not (
+            save_kwargs.get("optimize") or save_kwargs.get("progressive")
+        ):
+            raise
+        # Pillow sizes the optimize/progressive buffer at ~1 byte per pixel
+        # below quality 95, which noisy images overflow ("Suspension not
+        # allowed here"); retry with room for the raw pixels
+        out_buf = io.BytesIO()
+        with _MAXBLOCK_LOCK:
+            maxblock = ImageFile.MAXBLOCK
+            ImageFile.MAXBLOCK = max(maxblock, 4 * img.width * img.height + 65536)
+            try:
+                img.save(out_buf, **save_kwargs)
+            finally:
+                ImageFile.MAXBLOCK = maxblock
+    return out_buf.getvalue()
+
+
+def _bisect_quality(img, out_format: str, target: float, tried: dict):
+    """(quality, bytes) of the best fast encode under `target`.
+
+    Stops early once a result lands within _TARGET_TOLERANCE under the
+    target; bytes is None when even the lowest quality is too big. `tried`
+    memoizes encodes by quality across calls.
+    """
+    lo, hi = _QUALITY_RANGE
+    best_q, best = lo, None
+    while lo <= hi:
+        q = (lo + hi) // 2
+        if q not in tried:
+            tried[q] = _encode(img, out_format, q, "fast")
+        data = tried[q]
+        if len(data) > target:
+            hi = q - 1
+            continue
+        best_q, best = q, data
+        if len(data) >= target * (1 - _TARGET_TOLERANCE):
+            break
+        lo = q + 1
+    return best_q, best
+
+
+def _ratio_at(ratios: dict, q: int) -> float:
+    """Full/fast size ratio at `q`, interpolated between measured qualities."""
+    known = sorted(ratios)
+    if q <= known[0]:
+        return ratios[known[0]]
+    if q >= known[-1]:
+        return ratios[known[-1]]
+    b = next(k for k in known if k >= q)
+    a = known[known.index(b) - 1]
+    return ratios[a] + (ratios[b] - ratios[a]) * (q - a) / (b - a)
+
+
+def _predict_quality(img, out_format: str, target: float, tried: dict, ratios: dict, lo: int, hi: int):
+    """Highest quality strictly between lo and hi whose fast size, scaled by
+    the full/fast ratio, fits `target`; None if none is predicted to."""
+    best = None
+    a, b = lo + 1, hi - 1
+    while a <= b:
+        q = (a + b) // 2
+        if q not in tried:
+            tried[q] = _encode(img, out_format, q, "fast")
+        if len(tried[q]) * _ratio_at(ratios, q) <= target:
+            best, a = q, q + 1
+        else:
+            b = q - 1
+    return best
+
+
+def _encode_to_size(
+    img: Image.Image, out_format: str, target_bytes: int, effort: str = "smallest"
+) -> bytes:
+    """Highest-quality encoding of `img` that fits in `target_bytes`.
+
+    Quality is bisected with the fast encoder, then encoded at `effort`.
+    Full-effort output can be much smaller (or larger) than fast output at
+    the same quality, and the gap changes with quality. A final encode
+    outside the tolerance band therefore records the full/fast size ratio at
+    its quality and predicts the next quality from the fast sizes scaled by
+    the interpolated ratio. Predictions stay between the best fitting and
+    the lowest overshooting quality seen. When nothing fits at fast effort,
+    the search starts from quality 1. At most _MAX_FINAL_ENCODES encodes run
+    at `effort`. A fitting fast encode beats an overshooting final one. If
+    nothing fits, the lowest quality is returned.
+    """
+    if out_format not in _LOSSY:
+        raise ValueError(f"target_bytes needs a lossy format: {', '.join(_LOSSY)}")
+    floor = target_bytes * (1 - _TARGET_TOLERANCE)
+    tried = {}
+
+    q, fast = _bisect_quality(img, out_format, target_bytes, tried)
+    if effort == "fast":
+        return fast if fast is not None else tried[q]
+
+    # predictions aim mid-band, the last one at the floor: the ratio drifts a
+    # little between qualities and an overshoot then can't be corrected
+    final, ratios = {}, {}
+    lo, hi = _QUALITY_RANGE[0] - 1, _QUALITY_RANGE[1] + 1  # fits / overshoots
+    for left in reversed(range(_MAX_FINAL_ENCODES)):
+        final[q] = _encode(img, out_format, q, effort)
+        size = len(final[q])
+        if size <= target_bytes:
+            lo = q
+            if size >= floor:
+                break
+        else:
+            hi = q
+        if not left or hi - lo <= 1:
+            break
+        ratios[q] = size / len(tried[q])
+        aim = floor if left == 1 else target_bytes * (1 - _TARGET_TOLERANCE / 2)
+        q = _predict_quality(img, out_format, aim, tried, ratios, lo, hi) or lo + 1
+
+    fits = [k for k in final if len(final[k]) <= target_bytes]
+    if fits:
+        return final[max(fits)]  # highest quality that fits
+    return fast if fast is not None else final[min(final)]
+
+
+def _normalize_params(params: dict) -> dict:
+    params["to_format"] = _normalize_format(params["to_format"])
+    params["effort"] = _normalize_effort(params["effort"])
+    params["target_bytes"] = int(params["target_bytes"] or 0)
+    return params
+
+
+def _convert(
+    to_format: str,
+    raw_bytes,
+    max_width: int,
+    flatten_bg: _Tuple[int, int, int],
+    effort: str,
+    target_bytes: int,
+) -> Tuple[str, bytes, Image.Image]:
+    src = _open_src(raw_bytes)
+    out_format = _normalize_format(to_format)
+    effort = _normalize_effort(effort)
+
+    # Open (reduced-scale decode when shrinking) and apply EXIF orientation
+    img, full = _open_oriented(src, max_width)
+
+    # resize (keep aspect ratio): reduce() by whole factors, then BICUBIC
+    img = _resize(img, _target_size(full, max_width))
+
+    img = _prepare(img, out_format, flatten_bg)
+    if target_bytes:
+        return out_format.lower(), _encode_to_size(img, out_format, target_bytes, effort), img
+    return out_format.lower(), _encode(img, out_format, effort=effort), img
+
+
+def image_format_converter(
+    to_format: str = "png",
+    raw_bytes: bytes = b"",
+    max_width: int = 0,
+    *,
+    flatten_bg: _Tuple[int, int, int] = (
+        255,
+        255,
+        255,
+    ),  # if needed
+    effort: str = "smallest",  # see EFFORTS
+    target_bytes: int = 0,  # JPEG/WEBP/HEIF: pick quality to fit; 0 = off
+) -> Tuple[str, bytes, Image.Image]:
+    """(format, bytes, image) of the converted output.
+
+    Only (format, bytes) is cached (see image_format_bytes); on a hit the
+    image is the output opened again, decoded when first used. For ICO that
+    is the largest icon size.
+    """
+    opts = (max_width,)
+    kwargs = dict(flatten_bg=flatten_bg, effort=effort, target_bytes=target_bytes)
+    key = image_format_bytes.cache_key(to_format, raw_bytes, *opts, **kwargs)
+    hit = image_format_bytes.cache.get(key)
+    if not is_miss(hit):
+        fmt, data = hit
+        return fmt, data, Image.open(io.BytesIO(data))
+    fmt, data, img = _convert(to_format, raw_bytes, max_width, flatten_bg, effort, target_bytes)
+    image_format_bytes.cache.put(key, (fmt, data))
+    return fmt, data, img
+
+
+@cached("image", normalize=_normalize_params)
+def image_format_bytes(
+    to_format: str = "png",
+    raw_bytes: bytes = b"",
+    max_width: int = 0,
+    *,
+    flatten_bg: _Tuple[int, int, int] = (255, 255, 255),
+    effort: str = "smallest",
+    target_bytes: int = 0,
+) -> Tuple[str, bytes]:
+    """image_format_converter's (format, bytes). This is what the result cache
+    keeps: a decoded image costs up to 4 bytes a pixel on top of the output."""
+    return _convert(to_format, raw_bytes, max_width, flatten_bg, effort, target_bytes)[:2]
+
+
+@cached("image_preview", normalize=_normalize_params)
+def convert_with_preview(
+    to_format: str = "png",
+    raw_bytes: bytes = b"",
+    max_width: int = 0,
+    *,
+    flatten_bg: _Tuple[int, int, int] = (255, 255, 255),
+    effort: str = "smallest",
+    target_bytes: int = 0,
+) -> Tuple[str, bytes, Optional[bytes], _Tuple[int, int]]:
+    """image_format_converter, but returns (format, bytes, preview, (w, h)).
+
+    No PIL image comes back, so process-pool results stay small; preview is
+    None when the output can be shown as is (see make_preview).
+    """
+    fmt, data, img = _convert(to_format, raw_bytes, max_width, flatten_bg, effort, target_bytes)
+    return fmt, data, make_preview(img, data, fmt), img.size
+
+
+def _normalize_targets(targets) -> List[_Tuple[str, int, Optional[int]]]:
+    if not targets:
+        raise ValueError("targets must list at least one (format, width, quality).")
+    specs = []
+    for target in targets:
+        fmt, width, quality = (tuple(target) + (None,))[:3]
+        specs.append((_normalize_format(fmt), int(width or 0), quality or None))
+    return specs
+
+
+def _normalize_variant_params(params: dict) -> dict:
+    params["targets"] = _normalize_targets(params["targets"])
+    params["effort"] = _normalize_effort(params["effort"])
+    return params
+
+
+@cached("image_variants", normalize=_normalize_variant_params)
+def image_variants(
+    raw_bytes: bytes = b"",
+    targets: Sequence[tuple] = (),
+    *,
+    flatten_bg: _Tuple[int, int, int] = (255, 255, 255),
+    effort: str = "smallest",  # see EFFORTS
+) -> List[_Tuple[str, int, bytes]]:
+    """Encode several (format, max_width, quality) targets from one decode.
+
+    max_width 0 keeps the original size and quality None uses the format's
+    default. The source is decoded once (JPEG at a reduced DCT scale when
+    every target is smaller), then resized largest-first with each size
+    resampled from the next larger one. Returns (format, width, bytes) per
+    target, in order.
+    """
+    src = _open_src(raw_bytes)
+    specs = _normalize_targets(targets)
+    effort = _normalize_effort(effort)
+
+    widths = [w for _, w, _ in specs]
+    img, full = _open_oriented(src, 0 if 0 in widths else max(widths))
+
+    resized, prev = {}, img
+    for size in sorted({_target_size(full, w) for w in widths}, reverse=True):
+        prev = resized[size] = _resize(prev, size)
 
-    return out_format.lower(), out_buf.getvalue(), img
+    variants = []
+    for fmt, width, quality in specs:
+        out = _prepare(resized[_target_size(full, width)], fmt, flatten_bg)
+        variants.append((fmt.lower(), out.width, _encode(out, fmt, quality, effort)))
+    return variants
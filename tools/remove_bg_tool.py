@@ -1,81 +1,705 @@
 # remove_bg_tool.py
 import io
-from typing import Tuple
+import os
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass, fields
+from typing import List, Optional, Tuple
+import numpy as np
+import onnxruntime as ort
 from PIL import Image, ImageOps, ImageFilter
-from rembg import remove as rembg_remove, new_session
+from rembg import remove as rembg_remove
+from rembg.bg import alpha_matting_cutout, naive_cutout
+from rembg.sessions import sessions_class
 
-_sessions = {}
+from tools.helpers import make_preview, open_input
+from tools.result_cache import cached, is_miss
 
-def get_session(model_name: str = "u2net"):  # default to faster model
-    if model_name not in _sessions:
-        _sessions[model_name] = new_session(model_name)
-    return _sessions[model_name]
 
+@dataclass(frozen=True)
+class SessionConfig:
+    """onnxruntime settings for a rembg session (also part of its cache key)."""
 
-def _pre_downscale(raw_bytes: bytes, longest: int) -> bytes:
-    """Downscale the image BEFORE rembg to limit pixels processed."""
-    if longest <= 0:
-        return raw_bytes
-    im = Image.open(io.BytesIO(raw_bytes))
-    im = ImageOps.exif_transpose(im)
+    intra_op_threads: int = 0  # 0 = onnxruntime default (all cores)
+    inter_op_threads: int = 0
+    graph_optimization: str = "all"  # "disable" | "basic" | "extended" | "all"
+    execution_mode: str = "sequential"  # "sequential" | "parallel"
+    enable_mem_arena: bool = True
+    enable_mem_pattern: bool = True
+    variant: str = ""  # e.g. "int8" loads <U2NET_HOME>/<model>.int8.onnx
+
+
+# TOOLSTACK_ORT_* env var -> SessionConfig field
+_ENV_FIELDS = {
+    "TOOLSTACK_ORT_INTRA_THREADS": "intra_op_threads",
+    "TOOLSTACK_ORT_INTER_THREADS": "inter_op_threads",
+    "TOOLSTACK_ORT_GRAPH_OPT": "graph_optimization",
+    "TOOLSTACK_ORT_EXECUTION_MODE": "execution_mode",
+    "TOOLSTACK_ORT_MEM_ARENA": "enable_mem_arena",
+    "TOOLSTACK_ORT_MEM_PATTERN": "enable_mem_pattern",
+    "TOOLSTACK_MODEL_VARIANT": "variant",
+}
+
+_GRAPH_OPT = {
+    "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+
+def _coerce(field_type, value):
+    if field_type in (bool, "bool") and isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    if field_type in (int, "int"):
+        return int(value)
+    return value
+
+
+def load_session_config(profile: str = "default") -> SessionConfig:
+    """Build a SessionConfig from a JSON profile file plus env overrides.
+
+    TOOLSTACK_ORT_CONFIG may point to a JSON file of named profiles, e.g.
+    {"default": {"intra_op_threads": 4}, "int8": {"variant": "int8"}}.
+    TOOLSTACK_ORT_* env vars then override single fields for every profile.
+    rembg's own OMP_NUM_THREADS convention is honored as a thread default.
+    """
+    types = {f.name: f.type for f in fields(SessionConfig)}
+    values = {}
+    if "OMP_NUM_THREADS" in os.environ:
+        threads = int(os.environ["OMP_NUM_THREADS"])
+        values.update(intra_op_threads=threads, inter_op_threads=threads)
+
+    path = os.environ.get("TOOLSTACK_ORT_CONFIG")
+    if path:
+        with open(os.path.expanduser(path), "r", encoding="utf-8") as f:
+            profiles = json.load(f)
+        if profile not in profiles and profile != "default":
+            raise ValueError(f"Unknown session profile '{profile}' in {path}")
+        values.update(profiles.get(profile, {}))
+
+    for env, name in _ENV_FIELDS.items():
+        if env in os.environ:
+            values[name] = os.environ[env]
+
+    unknown = set(values) - set(types)
+    if unknown:
+        raise ValueError(f"Unknown session config keys: {sorted(unknown)}")
+    cfg = SessionConfig(**{k: _coerce(types[k], v) for k, v in values.items()})
+    if cfg.graph_optimization not in _GRAPH_OPT:
+        raise ValueError(f"Unknown graph optimization level: {cfg.graph_optimization}")
+    return cfg
+
+
+DEFAULT_SESSION_CONFIG = load_session_config()
+
+
+def _session_options(cfg: SessionConfig) -> ort.SessionOptions:
+    opts = ort.SessionOptions()
+    if cfg.intra_op_threads > 0:
+        opts.intra_op_num_threads = cfg.intra_op_threads
+    if cfg.inter_op_threads > 0:
+        opts.inter_op_num_threads = cfg.inter_op_threads
+    opts.graph_optimization_level = _GRAPH_OPT[cfg.graph_optimization]
+    opts.execution_mode = (
+        ort.ExecutionMode.ORT_PARALLEL
+        if cfg.execution_mode == "parallel"
+        else ort.ExecutionMode.ORT_SEQUENTIAL
+    )
+    opts.enable_cpu_mem_arena = cfg.enable_mem_arena
+    opts.enable_mem_pattern = cfg.enable_mem_pattern
+    return opts
+
+
+def _session_class(model_name: str, cfg: SessionConfig):
+    base = next((c for c in sessions_class if c.name() == model_name), None)
+    if base is None:
+        raise ValueError(f"Unknown rembg model: {model_name}")
+    if not cfg.variant:
+        return base
+
+    # pre-optimized / quantized weights: same pre/post-processing as the base
+    # model, only the .onnx file differs
+    path = os.path.join(base.u2net_home(), f"{model_name}.{cfg.variant}.onnx")
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Model variant not found: {path}")
+    return type(
+        f"{base.__name__}_{cfg.variant}",
+        (base,),
+        {"download_models": classmethod(lambda cls, *args, **kwargs: path)},
+    )
+
+
+_FALLBACK_SESSION_BYTES = 200 * 1024 * 1024
+
+
+def _session_nbytes(session) -> int:
+    """Approximate resident size of a session: its .onnx weights dominate."""
+    path = getattr(session.inner_session, "_model_path", None)
+    try:
+        return os.path.getsize(path)
+    except (TypeError, OSError):
+        return _FALLBACK_SESSION_BYTES
+
+
+class _SessionManager:
+    """Thread-safe LRU cache of loaded sessions under a memory budget.
+
+    Concurrent first requests for the same (model, config) share one load
+    instead of each loading the model. The least recently used sessions are
+    dropped once the budget is exceeded; the newest one is always kept, and
+    callers still holding an evicted session can finish with it.
+    """
+
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()  # key -> (session, nbytes)
+        self._loading = {}  # key -> Future of an in-flight load
+
+    def get(self, model_name: str, cfg: SessionConfig):
+        key = (model_name, cfg)
+        with self._lock:
+            if key in self._sessions:
+                self._sessions.move_to_end(key)
+                return self._sessions[key][0]
+            pending = self._loading.get(key)
+            if pending is None:
+                pending = self._loading[key] = Future()
+                loader = True
+            else:
+                loader = False
+
+        if not loader:
+            return pending.result()
+
+        try:
+            session = _session_class(model_name, cfg)(
+                model_name, _session_options(cfg)
+            )
+        except BaseException as e:
+            with self._lock:
+                del self._loading[key]
+            pending.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._loading[key]
+            self._sessions[key] = (session, _session_nbytes(session))
+            self._evict(keep=key)
+        pending.set_result(session)
+        return session
+
+    def _evict(self, keep):
+        total = self.resident_bytes()
+        for key in list(self._sessions):
+            if total <= self.budget_bytes:
+                break
+            if key != keep:
+                total -= self._sessions.pop(key)[1]
+
+    def resident_bytes(self) -> int:
+        return sum(nbytes for _, nbytes in self._sessions.values())
+
+    def loaded(self) -> List[Tuple[str, SessionConfig]]:
+        with self._lock:
+            return list(self._sessions)
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+
+# TOOLSTACK_SESSION_BUDGET_MB caps the models kept resident (u2net and
+# isnet-general-use are ~170 MB each, u2netp ~5 MB)
+_sessions = _SessionManager(
+    int(os.environ.get("TOOLSTACK_SESSION_BUDGET_MB", 512)) * 1024 * 1024
+)
+
+DEFAULT_MODEL = "u2net"
+
+
+def get_session(
+    model_name: str = DEFAULT_MODEL,  # default to faster model
+    config: Optional[SessionConfig] = None,
+):
+    return _sessions.get(model_name, config or DEFAULT_SESSION_CONFIG)
+
+
+# Input normalization per model, same as rembg's session classes:
+# (mean, std, model input size)
+_MODEL_INPUTS = {
+    "u2net": ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225), (320, 320)),
+    "u2netp": ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225), (320, 320)),
+    "isnet-general-use": ((0.5, 0.5, 0.5), (1.0, 1.0, 1.0), (1024, 1024)),
+}
+
+
+def _decode(raw_bytes: bytes) -> Image.Image:
+    """Decode and apply EXIF orientation."""
+    return ImageOps.exif_transpose(Image.open(open_input(raw_bytes)))
+
+
+def _fit_longest(im: Image.Image, longest: int) -> Image.Image:
+    """Cap the longest side at `longest` (0 = no cap, never upscales)."""
     w, h = im.size
     scale_from = max(w, h)
-    if scale_from <= longest:
-        # already small enough
-        buf = io.BytesIO()
-        im.save(buf, format="PNG")
-        buf.seek(0)
-        return buf.getvalue()
+    if longest <= 0 or scale_from <= longest:
+        return im
     s = float(longest) / float(scale_from)
     nw, nh = int(w * s), int(h * s)
-    im = im.resize((nw, nh), Image.LANCZOS)
-    buf = io.BytesIO()
-    im.save(buf, format="PNG")
-    buf.seek(0)
-    return buf.getvalue()
+    return im.resize((nw, nh), Image.LANCZOS)
 
 
-def remove_bg(
-    raw_bytes: bytes,
-    max_width: int = 0,  # output width cap; 0 keeps model-output size
-    quality: str = "high",  # "fast" (no matting) | "high" (matting)
-    model: str = "u2net",  # "u2netp" (fastest), "u2net" (fast), "isnet-general-use" (best)
-    feather_px: float = 0.5,  # tiny edge soften; set 0 to disable
-    longest_side_in: int = 1280,  # *** preprocess cap BEFORE rembg ***
-    png_compress_level: int = 6,  # 0=fastest, 9=smallest
-) -> Tuple[bytes, Image.Image]:
+def _cap_width(im: Image.Image, max_width: int) -> Image.Image:
+    """Full-res mode: no point refining pixels the output width cap drops."""
+    if max_width > 0 and im.width > max_width:
+        nh = int(im.height * (max_width / im.width))
+        return im.resize((max_width, nh), Image.LANCZOS)
+    return im
+
+
+def _load_downscaled(raw_bytes: bytes, longest: int) -> Image.Image:
+    """Decode, apply EXIF orientation and cap the longest side at `longest`."""
+    return _fit_longest(_decode(raw_bytes), longest)
+
+
+def _to_tensor(img: Image.Image, mean, std, size) -> np.ndarray:
+    """CHW float32 model input, normalized the way rembg does it."""
+    arr = np.asarray(img.convert("RGB").resize(size, Image.LANCZOS), dtype=np.float32)
+    arr = arr / max(float(arr.max()), 1e-6)
+    arr = (arr - np.asarray(mean, dtype=np.float32)) / np.asarray(std, dtype=np.float32)
+    return arr.transpose((2, 0, 1))
+
+
+def _predict_masks(session, model: str, images: List[Image.Image]) -> List[Image.Image]:
+    """Run several images through the ONNX session as one stacked tensor."""
+    mean, std, size = _MODEL_INPUTS[model]
+    ort_session = session.inner_session
+    inp = ort_session.get_inputs()[0]
+    batch = np.stack([_to_tensor(im, mean, std, size) for im in images])
+
+    if isinstance(inp.shape[0], int) and inp.shape[0] == 1:
+        # model exported with a fixed batch dimension
+        pred = np.concatenate(
+            [
+                ort_session.run(None, {inp.name: batch[i : i + 1]})[0]
+                for i in range(len(images))
+            ]
+        )
+    else:
+        pred = ort_session.run(None, {inp.name: batch})[0]
+
+    masks = []
+    for im, p in zip(images, pred[:, 0, :, :]):
+        p = (p - p.min()) / max(float(p.max() - p.min()), 1e-6)
+        mask = Image.fromarray((p * 255).astype("uint8"))
+        masks.append(mask.resize(im.size, Image.LANCZOS))
+    return masks
+
+
+def _box_mean(a: np.ndarray, r: int) -> np.ndarray:
+    """Mean over (2r+1)x(2r+1) windows, clipped at the borders (two cumsum passes)."""
+    h, w = a.shape
+    ys, xs = np.arange(h), np.arange(w)
+    y0, y1 = np.clip(ys - r, 0, h), np.clip(ys + r + 1, 0, h)
+    x0, x1 = np.clip(xs - r, 0, w), np.clip(xs + r + 1, 0, w)
+    c = np.zeros((h + 1, w))
+    np.cumsum(a, 0, out=c[1:])
+    rows = c[y1] - c[y0]
+    c = np.zeros((h, w + 1))
+    np.cumsum(rows, 1, out=c[:, 1:])
+    return (c[:, x1] - c[:, x0]) / np.outer(y1 - y0, x1 - x0)
+
 
-    # 1) Pre-downscale to cut inference time massively
-    pre_bytes = _pre_downscale(raw_bytes, longest=longest_side_in)
-
-    # 2) Session (cached)
-    session = get_session(model)
-
-    # 3) Rembg (bytes in → bytes out)
-    use_matting = quality == "high"
-    cut_bytes = rembg_remove(
-        pre_bytes,
-        session=session,
-        alpha_matting=use_matting,
-        alpha_matting_foreground_threshold=240,
-        alpha_matting_background_threshold=10,
-        alpha_matting_erode_size=10,
+def _rgb(img: Image.Image) -> np.ndarray:
+    return np.asarray(img.convert("RGB"), dtype=np.float64) / 255.0
+
+
+def _guided_coeffs(guide: np.ndarray, src: np.ndarray, radius: int, eps: float):
+    """Box-averaged linear coefficients (a, b) of the colour guided filter (He et al.).
+
+    `guide` is HxWx3, `src` HxW; the output is q = sum_c(a[..., c] * I_c) + b.
+    """
+    h, w = src.shape
+    mean_i = np.dstack([_box_mean(guide[..., c], radius) for c in range(3)])
+    mean_p = _box_mean(src, radius)
+    cov_ip = np.dstack(
+        [_box_mean(guide[..., c] * src, radius) for c in range(3)]
+    ) - mean_i * mean_p[..., None]
+    sigma = np.empty((h, w, 3, 3))
+    for i in range(3):
+        for j in range(i, 3):
+            var = _box_mean(guide[..., i] * guide[..., j], radius) - mean_i[..., i] * mean_i[..., j]
+            sigma[..., i, j] = sigma[..., j, i] = var
+    sigma += eps * np.eye(3)
+    a = np.linalg.solve(sigma, cov_ip[..., None])[..., 0]
+    b = mean_p - (a * mean_i).sum(-1)
+    return np.dstack([_box_mean(a[..., c], radius) for c in range(3)]), _box_mean(b, radius)
+
+
+def _guided_upsample(
+    small: Image.Image,
+    alpha_small: Image.Image,
+    full: Image.Image,
+    radius: int = 4,
+    eps: float = 1e-4,
+) -> Image.Image:
+    """Upsample a low-res alpha to `full`'s size, snapping edges to full-res detail.
+
+    Fast guided filter: coefficients are solved at `small`'s resolution and
+    only bilinearly upsampled, so the full-res cost is one multiply-add.
+    """
+    a, b = _guided_coeffs(
+        _rgb(small), np.asarray(alpha_small, dtype=np.float64) / 255.0, radius, eps
     )
+    size = full.size
+
+    def up(x):
+        return np.asarray(Image.fromarray(x.astype(np.float32)).resize(size, Image.BILINEAR))
+
+    full = full.convert("RGB")
+    q = up(b).copy()
+    for c in range(3):
+        q += up(a[..., c]) * (np.asarray(full.getchannel(c), dtype=np.float32) / 255.0)
+    return Image.fromarray((np.clip(q, 0.0, 1.0) * 255.0 + 0.5).astype(np.uint8))
+
+
+def _guided_filter(
+    img: Image.Image,
+    mask: Image.Image,
+    radius: int = 16,
+    eps: float = 1e-4,
+    subsample: int = 4,
+) -> Image.Image:
+    """Edge-aware mask refinement at the image's own resolution.
+
+    Solved on a grid `subsample` times coarser (radius scaled to match) and
+    applied at full resolution, which keeps it in the tens of milliseconds.
+    """
+    size = (max(1, img.width // subsample), max(1, img.height // subsample))
+    small = img.resize(size, Image.BILINEAR)
+    return _guided_upsample(
+        small, mask.resize(size, Image.BILINEAR), img, max(1, radius // subsample), eps
+    )
+
+
+def _trimap(mask: Image.Image, fg_threshold=240, bg_threshold=10, erode_size=10):
+    """Same trimap rembg builds for alpha matting: 255 fg, 0 bg, 128 unknown."""
+    from scipy.ndimage import binary_erosion
+
+    m = np.asarray(mask)
+    structure = np.ones((erode_size, erode_size), dtype=np.uint8) if erode_size else None
+    is_fg = binary_erosion(m > fg_threshold, structure=structure)
+    is_bg = binary_erosion(m < bg_threshold, structure=structure, border_value=1)
+    trimap = np.full(m.shape, 128, dtype=np.uint8)
+    trimap[is_fg] = 255
+    trimap[is_bg] = 0
+    return trimap
+
+
+def _band_matting(img: Image.Image, mask: Image.Image) -> Image.Image:
+    """Closed-form matting solved only for the unknown band of the trimap.
 
-    # 4) Open result for optional feather + resize
-    out = Image.open(io.BytesIO(cut_bytes)).convert("RGBA")
+    rembg's path solves a system over every pixel, with the known ones pinned
+    by a penalty term; here known alphas are substituted in and only the
+    band's unknowns go to the preconditioned CG solver.
+    """
+    from pymatting import cf_laplacian, cg, estimate_foreground_ml, ichol
+
+    rgb = _rgb(img)
+    trimap = _trimap(mask)
+    unknown = trimap == 128
+    if not unknown.any() or unknown.all():
+        return naive_cutout(img, mask)
+
+    # everything outside the band's bounding box (plus one Laplacian window)
+    # is known and stays as the trimap says
+    ys, xs = np.nonzero(unknown)
+    h, w = trimap.shape
+    y0, y1 = max(0, ys.min() - 2), min(h, ys.max() + 3)
+    x0, x1 = max(0, xs.min() - 2), min(w, xs.max() + 3)
+    crop = rgb[y0:y1, x0:x1]
+    flat = trimap[y0:y1, x0:x1].ravel()
+    band = flat == 128
+    known = ~band
+
+    lap = cf_laplacian(crop, is_known=known)
+    lap_uu = lap[band][:, band].tocsr()
+    rhs = -(lap[band][:, known] @ (flat[known] / 255.0))
+    sub = flat / 255.0
+    sub[band] = np.clip(cg(lap_uu, rhs, M=ichol(lap_uu), rtol=1e-7), 0.0, 1.0)
+    alpha = trimap / 255.0
+    alpha[y0:y1, x0:x1] = sub.reshape(y1 - y0, x1 - x0)
+
+    fg = rgb.copy()
+    fg[y0:y1, x0:x1] = estimate_foreground_ml(crop, alpha[y0:y1, x0:x1])
+    out = np.dstack([np.clip(fg, 0.0, 1.0), alpha])
+    return Image.fromarray((out * 255.0 + 0.5).astype(np.uint8))
+
+
+# quality -> edge refinement after inference, cheapest first:
+#   "fast"   raw model mask
+#   "refine" colour guided filter on the mask, tens of milliseconds
+#   "trimap" closed-form matting solved only over the uncertain band
+#   "high"   rembg's full-image closed-form matting (pymatting)
+QUALITY_LEVELS = ("fast", "refine", "trimap", "high")
+
+
+def _cutout(img: Image.Image, mask: Image.Image, quality: str) -> Image.Image:
+    """Cut `img` out with `mask`, refining edges as `quality` asks."""
+    if quality not in QUALITY_LEVELS:
+        raise ValueError(f"Unknown quality '{quality}'. Use one of {QUALITY_LEVELS}")
+    if quality == "refine":
+        return naive_cutout(img, _guided_filter(img, mask))
+    if quality == "trimap":
+        return _band_matting(img, mask)
+    if quality == "high":
+        # same call rembg.remove makes (matting falls back to naive)
+        try:
+            return alpha_matting_cutout(img, mask, 240, 10, 10)
+        except ValueError:
+            pass
+    return naive_cutout(img, mask)
+
+
+def _predict_mask(session, model: str, img: Image.Image) -> Image.Image:
+    if model in _MODEL_INPUTS:
+        return _predict_masks(session, model, [img])[0]
+    return rembg_remove(img, session=session, only_mask=True)
+
+
+def _apply_full_res(
+    full: Image.Image, small: Image.Image, cut_small: Image.Image, refine_edges: bool
+) -> Image.Image:
+    """Put the alpha predicted on `small` onto the full-resolution pixels."""
+    alpha_small = cut_small.convert("RGBA").getchannel("A")
+    if refine_edges:
+        alpha = _guided_upsample(small, alpha_small, full)
+    else:
+        alpha = alpha_small.resize(full.size, Image.BILINEAR)
+    out = full.convert("RGBA")
+    out.putalpha(alpha)
+    return out
+
+
+def _finish(
+    out: Image.Image, max_width: int, feather_px: float, png_compress_level: int
+) -> Tuple[bytes, Image.Image]:
+    """Feather, width-cap and encode a cut-out (the only encode in the pipeline)."""
+    if out.mode != "RGBA":
+        out = out.convert("RGBA")
 
     # tiny edge feather (after inference, before final save)
     if feather_px and feather_px > 0:
         out.putalpha(out.getchannel("A").filter(ImageFilter.GaussianBlur(feather_px)))
 
-    # 5) Output size policy (width-capped, no upscaling)
+    # Output size policy (width-capped, no upscaling)
     if max_width > 0 and out.width > max_width:
         nh = int(out.height * (max_width / out.width))
         out = out.resize((max_width, nh), Image.LANCZOS)
 
-    # 6) Encode PNG (avoid heavy optimize)
+    # Encode PNG (avoid heavy optimize)
     buf = io.BytesIO()
     out.save(buf, format="PNG", compress_level=png_compress_level)
     buf.seek(0)
     return buf.getvalue(), out
+
+
+def _cut_full_res(
+    raw_bytes: bytes,
+    session,
+    model: str,
+    quality: str,
+    max_width: int,
+    longest_side_in: int,
+    refine_edges: bool,
+) -> Image.Image:
+    """Infer on a downscaled copy, then cut out the source-resolution pixels."""
+    full = _cap_width(_decode(raw_bytes), max_width)
+    small = _fit_longest(full, longest_side_in)
+    cut_small = _cutout(small, _predict_mask(session, model, small), quality)
+    return _apply_full_res(full, small, cut_small, refine_edges)
+
+
+def remove_bg(
+    raw_bytes: bytes,
+    max_width: int = 0,  # output width cap; 0 keeps model-output size
+    quality: str = "high",  # see QUALITY_LEVELS: "fast" | "refine" | "trimap" | "high"
+    model: str = DEFAULT_MODEL,  # "u2netp" (fastest), "u2net" (fast), "isnet-general-use" (best)
+    feather_px: float = 0.5,  # tiny edge soften; set 0 to disable
+    longest_side_in: int = 1280,  # *** preprocess cap BEFORE inference ***
+    png_compress_level: int = 6,  # 0=fastest, 9=smallest
+    session_config: Optional[SessionConfig] = None,  # None = env/profile default
+    full_res: bool = False,  # infer at longest_side_in, cut out at source size
+    refine_edges: bool = True,  # full_res only: guided-filter mask upsampling
+) -> Tuple[bytes, Image.Image]:
+    """Cut-out as (png_bytes, RGBA image).
+
+    Only the PNG is cached (see remove_bg_png); on a hit the image is the
+    PNG opened again, decoded when first used.
+    """
+    opts = (max_width, quality, model, feather_px, longest_side_in, png_compress_level)
+    opts += (session_config, full_res, refine_edges)
+    key = remove_bg_png.cache_key(raw_bytes, *opts)
+    png = remove_bg_png.cache.get(key)
+    if not is_miss(png):
+        return png, _open_png(png)
+    png, out = _remove_bg(raw_bytes, *opts)
+    remove_bg_png.cache.put(key, png)
+    return png, out
+
+
+@cached("remove_bg_png")
+def remove_bg_png(
+    raw_bytes: bytes,
+    max_width: int = 0,
+    quality: str = "high",
+    model: str = DEFAULT_MODEL,
+    feather_px: float = 0.5,
+    longest_side_in: int = 1280,
+    png_compress_level: int = 6,
+    session_config: Optional[SessionConfig] = None,
+    full_res: bool = False,
+    refine_edges: bool = True,
+) -> bytes:
+    """remove_bg's PNG only. This is what the result cache keeps: the full-size
+    RGBA image would cost 4 bytes a pixel on top of the PNG."""
+    return _remove_bg(
+        raw_bytes,
+        max_width,
+        quality,
+        model,
+        feather_px,
+        longest_side_in,
+        png_compress_level,
+        session_config,
+        full_res,
+        refine_edges,
+    )[0]
+
+
+def _open_png(png: bytes) -> Image.Image:
+    return Image.open(io.BytesIO(png))  # lazy: size now, pixels on first use
+
+
+def _remove_bg(
+    raw_bytes: bytes,
+    max_width: int,
+    quality: str,
+    model: str,
+    feather_px: float,
+    longest_side_in: int,
+    png_compress_level: int,
+    session_config: Optional[SessionConfig],
+    full_res: bool,
+    refine_edges: bool,
+) -> Tuple[bytes, Image.Image]:
+
+    # 1) Session (cached per model + config)
+    session = get_session(model, session_config)
+    if quality not in QUALITY_LEVELS:
+        raise ValueError(f"Unknown quality '{quality}'. Use one of {QUALITY_LEVELS}")
+
+    # 2) Full-res mode: low-res inference, mask upsampled onto the original
+    if full_res:
+        out = _cut_full_res(
+            raw_bytes,
+            session,
+            model,
+            quality,
+            max_width,
+            longest_side_in,
+            refine_edges,
+        )
+        return _finish(out, max_width, feather_px, png_compress_level)
+
+    # 3) Decode once, downscale BEFORE inference to limit pixels processed
+    img = _load_downscaled(raw_bytes, longest_side_in)
+
+    # 4) Mask + cut-out on in-memory images (no intermediate PNGs)
+    out = _cutout(img, _predict_mask(session, model, img), quality)
+
+    # 5) Feather, resize, encode
+    return _finish(out, max_width, feather_px, png_compress_level)
+
+
+def remove_bg_batch(
+    raw_list: List[bytes],
+    max_width: int = 0,
+    quality: str = "high",
+    model: str = DEFAULT_MODEL,
+    feather_px: float = 0.5,
+    longest_side_in: int = 1280,
+    png_compress_level: int = 6,
+    batch_size: int = 4,
+    session_config: Optional[SessionConfig] = None,
+    full_res: bool = False,
+    refine_edges: bool = True,
+) -> List[Tuple[bytes, Image.Image]]:
+    """remove_bg for several images, running inference `batch_size` at a time.
+
+    Same options and per-image results as remove_bg. Models without a known
+    input spec fall back to one remove_bg call per image.
+    """
+    if model not in _MODEL_INPUTS:
+        return [
+            remove_bg(
+                raw,
+                max_width,
+                quality,
+                model,
+                feather_px,
+                longest_side_in,
+                png_compress_level,
+                session_config,
+                full_res,
+                refine_edges,
+            )
+            for raw in raw_list
+        ]
+
+    # per-image lookups in remove_bg's cache; only the misses get inferred
+    opts = (max_width, quality, model, feather_px, longest_side_in, png_compress_level)
+    opts += (session_config, full_res, refine_edges)
+    keys = [remove_bg_png.cache_key(raw, *opts) for raw in raw_list]
+    results = [remove_bg_png.cache.get(key) for key in keys]
+    todo = [i for i, r in enumerate(results) if is_miss(r)]
+    results = [r if is_miss(r) else (r, _open_png(r)) for r in results]
+    if not todo:
+        return results
+
+    session = get_session(model, session_config)
+    batch_size = max(1, batch_size)
+    for start in range(0, len(todo), batch_size):
+        idx = todo[start : start + batch_size]
+        chunk = [raw_list[i] for i in idx]
+        if full_res:
+            fulls = [_cap_width(_decode(raw), max_width) for raw in chunk]
+            images = [_fit_longest(im, longest_side_in) for im in fulls]
+        else:
+            images = [_load_downscaled(raw, longest_side_in) for raw in chunk]
+        masks = _predict_masks(session, model, images)
+        for j, (img, mask) in enumerate(zip(images, masks)):
+            out = _cutout(img, mask, quality)
+            if full_res:
+                out = _apply_full_res(fulls[j], img, out, refine_edges)
+            results[idx[j]] = _finish(out, max_width, feather_px, png_compress_level)
+            remove_bg_png.cache.put(keys[idx[j]], results[idx[j]][0])
+    return results
+
+
+def remove_bg_batch_previews(
+    raw_list: List[bytes], max_width: int = 0, **kwargs
+) -> List[Tuple[bytes, Optional[bytes], Tuple[int, int]]]:
+    """remove_bg_batch, but each result is (png_bytes, preview, (w, h)).
+
+    The preview (see make_preview) is built here, from the cut-out already
+    in memory, so callers neither keep nor receive the full PIL image.
+    """
+    return [
+        (png, make_preview(img, png, "png"), img.size)
+        for png, img in remove_bg_batch(raw_list, max_width, **kwargs)
+    ]
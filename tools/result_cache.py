@@ -0,0 +1,268 @@
+# result_cache.py
+"""Content-addressed cache for tool results.
+
+Keys are sha256(tool + input bytes + normalized options). Values are kept
+pickled, in an in-memory LRU and (optionally) on disk under
+~/.cache/toolstack/results, both bounded by size with LRU eviction.
+
+    TOOLSTACK_CACHE_MB       memory tier budget (default 256, 0 disables)
+    TOOLSTACK_DISK_CACHE_MB  disk tier budget (default 0 = off)
+    TOOLSTACK_CACHE_DIR      disk tier location
+"""
+import os
+import io
+import hashlib
+import inspect
+import pickle
+import threading
+import functools
+import multiprocessing
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+_MISS = object()
+
+
+def _in_pool_worker() -> bool:
+    # run_batch does lookups/stores in the parent for process-pool jobs
+    return multiprocessing.parent_process() is not None
+
+
+# ---------------- keys ----------------
+def _feed(h, value) -> None:
+    """Hash `value` into `h`: payloads by content, everything else by repr."""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        h.update(b"b%d:" % len(value))
+        h.update(value)
+    elif isinstance(value, io.BytesIO):
+        data = value.getvalue()  # an upload's own bytes; getbuffer() would copy
+        h.update(b"f%d:" % len(data))
+        h.update(data)
+        h.update(repr(getattr(value, "name", None)).encode())
+    elif hasattr(value, "read") and hasattr(value, "seek"):
+        pos = value.tell()
+        value.seek(0)
+        h.update(b"f:")
+        for chunk in iter(lambda: value.read(1 << 20), b""):
+            h.update(chunk)
+        value.seek(pos)
+        h.update(repr(getattr(value, "name", None)).encode())
+    elif isinstance(value, (list, tuple)):
+        h.update(b"l%d:" % len(value))
+        for v in value:
+            _feed(h, v)
+    elif isinstance(value, dict):
+        h.update(b"d%d:" % len(value))
+        for k in sorted(value, key=repr):
+            h.update(repr(k).encode())
+            _feed(h, value[k])
+    else:
+        h.update(repr(value).encode())
+    h.update(b";")
+
+
+def make_key(tool: str, params: dict) -> str:
+    h = hashlib.sha256(tool.encode() + b"\0")
+    for name in sorted(params):
+        h.update(name.encode() + b"=")
+        _feed(h, params[name])
+    return h.hexdigest()
+
+
+# ---------------- tiers ----------------
+class _MemoryTier:
+    def __init__(self, budget_bytes: int):
+        self.budget = budget_bytes
+        self._items: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            blob = self._items.get(key)
+            if blob is not None:
+                self._items.move_to_end(key)
+            return blob
+
+    def put(self, key: str, blob: bytes) -> None:
+        if len(blob) > self.budget:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._items[key] = blob
+            self._bytes += len(blob)
+            while self._bytes > self.budget:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+
+class _DiskTier:
+    def __init__(self, root: str, budget_bytes: int):
+        self.root = root
+        self.budget = budget_bytes
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key + ".pkl")
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as fh:
+                blob = fh.read()
+            os.utime(path)  # mtime doubles as the LRU clock
+            return blob
+        except OSError:
+            return None
+
+    def put(self, key: str, blob: bytes) -> None:
+        if len(blob) > self.budget:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as fh:
+                fh.write(blob)
+            os.replace(tmp, path)
+        except OSError:
+            return
+        self._evict()
+
+    def _evict(self) -> None:
+        with self._lock:
+            entries, total = [], 0
+            for dirpath, _, names in os.walk(self.root):
+                for n in names:
+                    if not n.endswith(".pkl"):
+                        continue
+                    p = os.path.join(dirpath, n)
+                    try:
+                        st = os.stat(p)
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, p))
+                    total += st.st_size
+            entries.sort()
+            for _, size, p in entries:
+                if total <= self.budget:
+                    break
+                try:
+                    os.remove(p)
+                    total -= size
+                except OSError:
+                    pass
+
+    def clear(self) -> None:
+        with self._lock:
+            for dirpath, _, names in os.walk(self.root):
+                for n in names:
+                    if n.endswith(".pkl"):
+                        try:
+                            os.remove(os.path.join(dirpath, n))
+                        except OSError:
+                            pass
+
+
+class ResultCache:
+    """Memory LRU in front of an optional disk tier; values are pickled."""
+
+    def __init__(self, memory_bytes: int, disk_bytes: int = 0, disk_dir: str = ""):
+        self.memory = _MemoryTier(memory_bytes) if memory_bytes > 0 else None
+        self.disk = _DiskTier(disk_dir, disk_bytes) if disk_bytes > 0 and disk_dir else None
+
+    def get(self, key: str) -> Any:
+        """Cached value for `key`, or the module's _MISS sentinel."""
+        blob = self.memory.get(key) if self.memory else None
+        if blob is None and self.disk:
+            blob = self.disk.get(key)
+            if blob is not None and self.memory:
+                self.memory.put(key, blob)
+        if blob is None:
+            return _MISS
+        try:
+            return pickle.loads(blob)
+        except Exception:
+            return _MISS
+
+    def put(self, key: str, value: Any) -> None:
+        try:
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return
+        if self.memory:
+            self.memory.put(key, blob)
+        if self.disk:
+            self.disk.put(key, blob)
+
+    def clear(self) -> None:
+        for tier in (self.memory, self.disk):
+            if tier:
+                tier.clear()
+
+
+_MB = 1024 * 1024
+_memory_mb = int(os.environ.get("TOOLSTACK_CACHE_MB", 256))
+_cache = ResultCache(
+    # a pool worker's memory tier would only duplicate the parent's
+    memory_bytes=0 if _in_pool_worker() else _memory_mb * _MB,
+    disk_bytes=int(os.environ.get("TOOLSTACK_DISK_CACHE_MB", 0)) * _MB,
+    disk_dir=os.environ.get("TOOLSTACK_CACHE_DIR")
+    or os.path.join(os.path.expanduser("~"), ".cache", "toolstack", "results"),
+)
+
+
+def get_cache() -> ResultCache:
+    return _cache
+
+
+def is_miss(value) -> bool:
+    return value is _MISS
+
+
+# ---------------- decorator ----------------
+def cached(tool: str, normalize: Optional[Callable[[dict], dict]] = None):
+    """Cache a tool function's results by content.
+
+    Arguments are bound to the signature (defaults filled in) so positional,
+    keyword and omitted-default calls share a key; `normalize` can rewrite
+    the bound params further (e.g. case-fold a format name). The wrapper
+    exposes ``cache_key(*args, **kwargs)`` and ``cache`` so batch runners can
+    look results up before dispatching work.
+    """
+
+    def decorate(fn):
+        sig = inspect.signature(fn)
+
+        def cache_key(*args, **kwargs) -> str:
+            bound = sig.bind(*args, **kwargs)
+            bound.apply_defaults()
+            params = dict(bound.arguments)
+            if normalize:
+                params = normalize(params)
+            return make_key(tool, params)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _in_pool_worker():
+                return fn(*args, **kwargs)
+            key = cache_key(*args, **kwargs)
+            hit = _cache.get(key)
+            if hit is not _MISS:
+                return hit
+            result = fn(*args, **kwargs)
+            _cache.put(key, result)
+            return result
+
+        wrapper.cache_key = cache_key
+        wrapper.cache = _cache
+        return wrapper
+
+    return decorate